@@ -0,0 +1,213 @@
+"""
+Equivalence check and micro-benchmark of the table-driven protection decoder in protection_decoder.py.
+
+"before" is the chain of bit tests get_realtime_data of both Daren drivers used to map the status words of the
+Service 42 response onto the Protection fields, "after" is apply_protection. The check runs both on every 16-bit
+value of every status word (the other words cycling through random values, every field depends on one word only)
+and on a random corpus of complete status word combinations, and compares all Protection fields. It also checks
+that apply_protection assigns the fields in the order of PROTECTION_FIELDS.
+
+Usage: python benchmarks/bench_protection.py [seconds per run] [corpus size]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from battery import Protection  # noqa: E402
+from protection_decoder import PROTECTION_BITS, PROTECTION_FIELDS, apply_protection  # noqa: E402
+
+DURATION = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+CORPUS_SIZE = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+
+
+def legacy_protection(protection, voltagestatus, currentstatus, temperaturestatus, warningstatus):
+    # check bit 2 for TOT_OVV_PROT and bit 0 for cell_OVV_PROT
+    if voltagestatus & (1 << 2) or voltagestatus & (1 << 0):
+        protection.high_voltage = 2
+    # check bit 6 for TOT_OVV_alarm and 4 for cell_OVV_alarm
+    elif voltagestatus & (1 << 6) or voltagestatus & (1 << 4):
+        protection.high_voltage = 1
+    else:
+        protection.high_voltage = 0
+
+    # check bit 3 for TOT_UNDV_PROT
+    if voltagestatus & (1 << 3):
+        protection.low_voltage = 2
+    # check bit 7 for TOT_UNDV_alarm
+    elif voltagestatus & (1 << 7):
+        protection.low_voltage = 1
+    else:
+        protection.low_voltage = 0
+
+    # check bit 1 for cell_UNDV_PROT
+    if voltagestatus & (1 << 1):
+        protection.low_cell_voltage = 2
+    # check bit 5 for cell_UNDV_alarm
+    elif voltagestatus & (1 << 5):
+        protection.low_cell_voltage = 1
+    else:
+        protection.low_cell_voltage = 0
+
+    # check bit 7 for low_BAT_alarm from warningstatus
+    if warningstatus & (1 << 7):
+        protection.low_soc = 2
+    else:
+        protection.low_soc = 0
+
+    # check bit 2 for CHG_OC_PROT
+    if currentstatus & (1 << 2):
+        protection.high_charge_current = 2
+    # check bit 6 for CHG_C_alarm
+    elif currentstatus & (1 << 6):
+        protection.high_charge_current = 1
+    else:
+        protection.high_charge_current = 0
+
+    # check bit 4 for DISCH_OC_1_PROT, bit 5 for DISCH_OC_2_PROT and bit 3 for Short_circuit_PROT
+    if currentstatus & (1 << 4) or currentstatus & (1 << 5) or currentstatus & (1 << 3):
+        protection.high_discharge_current = 2
+    # check bit 7 for DISCH_C_alarm
+    elif currentstatus & (1 << 7):
+        protection.high_discharge_current = 1
+    else:
+        protection.high_discharge_current = 0
+
+    # check bit 14 for V_DIF_PROT
+    if voltagestatus & (1 << 14):
+        protection.cell_imbalance = 2
+    # check bit 8 for V_DIF_ALARM
+    elif voltagestatus & (1 << 8):
+        protection.cell_imbalance = 1
+    else:
+        protection.cell_imbalance = 0
+
+    # Ignore V_DIF_alarm and low_BAT_alarm flags, since we're allready checking for those.
+    if (warningstatus & 0b01111110) > 0:
+        protection.internal_failure = 2
+    else:
+        protection.internal_failure = 0
+
+    # check bit 0 for CHG_H_TEMP_PROT
+    if temperaturestatus & (1 << 0):
+        protection.high_charge_temperature = 2
+    # check bit 8 for CHG_H_TEMP_alarm
+    elif temperaturestatus & (1 << 8):
+        protection.high_charge_temperature = 1
+    else:
+        protection.high_charge_temperature = 0
+
+    # check bit 1 for CHG_L_TEMP_PROT
+    if temperaturestatus & (1 << 1):
+        protection.low_charge_temperature = 2
+    # check bit 9 for CHG_L_TEMP_alarm
+    elif temperaturestatus & (1 << 9):
+        protection.low_charge_temperature = 1
+    else:
+        protection.low_charge_temperature = 0
+
+    # check bit 0 for CHG_H_TEMP_PROT and bit 2 for DISCH_H_TEMP_PROT
+    if temperaturestatus & (1 << 0) or temperaturestatus & (1 << 2):
+        protection.high_temperature = 2
+    # check bit 8 for CHG_H_TEMP_alarm and bit 10 for DISCH_H_TEMP_alarm
+    elif temperaturestatus & (1 << 8) or temperaturestatus & (1 << 10):
+        protection.high_temperature = 1
+    else:
+        protection.high_temperature = 0
+
+    # check bit 1 for CHG_L_TEMP_PROT and bit 3 for DISCH_L_TEMP_PROT
+    if temperaturestatus & (1 << 1) or temperaturestatus & (1 << 3):
+        protection.low_temperature = 2
+    # check bit 9 for CHG_L_TEMP_alarm and bit 11 for DISCH_L_TEMP_alarm
+    elif temperaturestatus & (1 << 9) or temperaturestatus & (1 << 11):
+        protection.low_temperature = 1
+    else:
+        protection.low_temperature = 0
+
+    # check bit 6 for MOS_H_TEMP_PROT and 4 for ENV_H_TEMP_PROT
+    if temperaturestatus & (1 << 6) or temperaturestatus & (1 << 4):
+        protection.high_internal_temperature = 2
+    # check bit 14 for MOS_H_TEMP_alarm and 12 for ENV_H_TEMP_alarm
+    elif temperaturestatus & (1 << 14) or temperaturestatus & (1 << 12):
+        protection.high_internal_temperature = 1
+    else:
+        protection.high_internal_temperature = 0
+
+    # check bit 13 for blown_fuse from voltagestatus
+    if voltagestatus & (1 << 13):
+        protection.fuse_blown = 2
+    else:
+        protection.fuse_blown = 0
+
+
+def status_word_cases(corpus_size, seed=1363):
+    """Every 16-bit value of every status word, then random combinations of all four."""
+    rng = random.Random(seed)
+    for position in range(4):
+        for value in range(1 << 16):
+            words = [rng.getrandbits(16) for _ in range(4)]
+            words[position] = value
+            yield words
+    for _ in range(corpus_size):
+        yield [rng.getrandbits(16) for _ in range(4)]
+
+
+class FieldOrder:
+    """Records the order apply_protection assigns the Protection fields in."""
+
+    def __init__(self):
+        object.__setattr__(self, "fields", [])
+
+    def __setattr__(self, name, value):
+        self.fields.append(name)
+
+
+def check_field_order():
+    recorder = FieldOrder()
+    apply_protection(recorder, 0, 0, 0, 0)
+    if tuple(recorder.fields) != PROTECTION_FIELDS:
+        raise SystemExit(f"apply_protection assigns {recorder.fields}, PROTECTION_FIELDS is {list(PROTECTION_FIELDS)}")
+
+
+def check_equivalence(corpus_size):
+    before, after = Protection(), Protection()
+    checked = 0
+    for words in status_word_cases(corpus_size):
+        legacy_protection(before, *words)
+        apply_protection(after, *words)
+        for field in PROTECTION_BITS:
+            if getattr(before, field) != getattr(after, field):
+                raise SystemExit(f"{field} differs for status words {[hex(word) for word in words]}: {getattr(before, field)} != {getattr(after, field)}")
+        checked += 1
+    return checked
+
+
+def operations_per_second(function, cases):
+    protection = Protection()
+    count = 0
+    deadline = time.perf_counter() + DURATION
+    started = time.perf_counter()
+    while time.perf_counter() < deadline:
+        for words in cases:
+            function(protection, *words)
+        count += len(cases)
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    check_field_order()
+    checked = check_equivalence(CORPUS_SIZE)
+    print(f"apply_protection matches the legacy bit tests on {checked:,} status word combinations")
+
+    rng = random.Random(42)
+    # mostly quiet words like on a healthy pack, some with random alarms
+    cases = [[0, 0, 0, 0]] * 90 + [[rng.getrandbits(16) for _ in range(4)] for _ in range(10)]
+    before = operations_per_second(legacy_protection, cases)
+    after = operations_per_second(apply_protection, cases)
+    print(f"decode    before: {before:12,.0f} ops/s   after: {after:12,.0f} ops/s  ({after / before:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Micro-benchmark of the YD/T1363 frame codec in protocol.py.
+
+"before" are the per-character string loops the drivers and the bridge used to build and check frames,
+"after" is the shared codec. Encode builds the Service 42 and Service B0 commands, decode and validate run on
+the sample SNS and Daren frames in parse.py.
+
+Usage: python benchmarks/bench_protocol.py [seconds per run]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import protocol  # noqa: E402
+from parse import dr, ho  # noqa: E402
+
+DURATION = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+
+COMMANDS = [
+    (b"\x08", b"\x42", b"\x42", ""),
+    (b"\x01", b"\x4A", b"\xB0", "0101030056"),
+]
+FRAMES = [ho, dr]
+
+
+def legacy_calculate_checksum(message):
+    checksum = 0
+    for value in message:
+        checksum = checksum + ord(value)
+    checksum = checksum ^ 0xFFFF
+    return checksum + 1
+
+
+def legacy_length_checksum(value):
+    value = value & 0x0FFF
+    n1 = value & 0xF
+    n2 = (value >> 4) & 0xF
+    n3 = (value >> 8) & 0xF
+    chksum = ((n1 + n2 + n3) & 0xF) ^ 0xF
+    chksum = chksum + 1
+    return value + (chksum << 12)
+
+
+def legacy_encode(addr, cid1, cid2, info=""):
+    command = ">22" + addr.hex().upper() + cid1.hex().upper() + cid2.hex().upper()
+    if len(info) > 0:
+        command += format(legacy_length_checksum(len(info)), "x").upper()
+        command += info
+    else:
+        command += "0000"
+    command += format(legacy_calculate_checksum(command[1:]), "x").upper()
+    return command + "\r"
+
+
+def legacy_validate(buff):
+    lenid = int(buff[9:13], base=16)
+    if legacy_length_checksum(lenid & 0x0FFF) != lenid:
+        return False
+    return legacy_calculate_checksum(buff[1 : len(buff) - 5]) == int(buff[len(buff) - 5 :], base=16)
+
+
+def legacy_decode(buff):
+    if not legacy_validate(buff):
+        return None
+    return (buff[0], int(buff[1:3], 16), int(buff[3:5], 16), int(buff[5:7], 16), int(buff[7:9], 16), buff[13:-5])
+
+
+def after_encode(addr, cid1, cid2, info=""):
+    return protocol.encode_command(protocol.SOI_SNS, addr[0], cid1[0], cid2[0], info)
+
+
+def operations_per_second(function, arguments):
+    count = 0
+    deadline = time.perf_counter() + DURATION
+    started = time.perf_counter()
+    while time.perf_counter() < deadline:
+        for _ in range(500):
+            for args in arguments:
+                function(*args)
+        count += 500 * len(arguments)
+    return count / (time.perf_counter() - started)
+
+
+def report(name, before, after):
+    print(f"{name:<9} before: {before:12,.0f} ops/s   after: {after:12,.0f} ops/s  ({after / before:.2f}x)")
+
+
+def main():
+    for command in COMMANDS:
+        if after_encode(*command).decode() != legacy_encode(*command):
+            raise SystemExit(f"encode differs from the legacy implementation for {command}")
+    for frame in FRAMES:
+        if not protocol.validate_frame(frame) or not legacy_validate(frame):
+            raise SystemExit(f"sample frame does not validate: {frame!r}")
+
+    frames = [(frame,) for frame in FRAMES]
+    raw_frames = [(frame.encode(),) for frame in FRAMES]
+    report("encode", operations_per_second(legacy_encode, COMMANDS), operations_per_second(after_encode, COMMANDS))
+    report("decode", operations_per_second(legacy_decode, frames), operations_per_second(protocol.decode_frame, raw_frames))
+    report("validate", operations_per_second(legacy_validate, frames), operations_per_second(protocol.validate_frame, raw_frames))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Refresh cycle time of the Daren485 and Daren485v2 drivers against a simulated module on a pty.
+
+The module answers every command of the drivers with the recorded frames from docs/daren_485_README.md
+(and the SNS Service 42 frame from parse.py for Daren485v2) after a configurable response delay,
+paced at the baud rate of the driver. The script times get_settings on a cold start and on a restart with
+the static info cache (in a temporary file), then times refresh_data and counts the commands it sends per cycle.
+
+Usage: python benchmarks/bench_refresh.py [cycles] [response delay in seconds]
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bms"))
+
+from daren_485 import Daren485  # noqa: E402
+from sns01_485 import Daren485v2  # noqa: E402
+from protocol import SOI_DAREN, SOI_SNS  # noqa: E402
+from simulator import SnsSlaveSimulator, documented_services  # noqa: E402
+from static_info_cache import static_info_cache  # noqa: E402
+from utils import logger  # noqa: E402
+
+DRIVERS = [
+    (Daren485, 19200, 0x01, SOI_DAREN),
+    (Daren485v2, 9600, 0x08, SOI_SNS),
+]
+
+
+def bench_refresh(driver, baud, address, soi, cycles, response_delay):
+    slave = SnsSlaveSimulator([address], baud, response_delay, documented_services(soi))
+    slave.start()
+    try:
+        settings = []
+        for _ in ("cold", "cached"):
+            battery = driver(slave.port, baud, bytes([address]))
+            started = time.monotonic()
+            if not battery.get_settings():
+                raise SystemExit(f"{driver.__name__}.get_settings failed against the simulated module")
+            settings.append(time.monotonic() - started)
+
+        durations = []
+        requests = slave.requests
+        for _ in range(cycles):
+            started = time.monotonic()
+            if not battery.refresh_data():
+                raise SystemExit(f"{driver.__name__}.refresh_data failed against the simulated module")
+            durations.append(time.monotonic() - started)
+        return settings, durations, (slave.requests - requests) / cycles
+    finally:
+        slave.stop()
+        slave.close()
+
+
+def main():
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    response_delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    logger.setLevel(logging.WARNING)
+    static_info_cache.path = os.path.join(tempfile.mkdtemp(), "static_info_cache.json")
+
+    print(f"{'driver':<12} {'settings cold':>14} {'cached':>8} {'refresh min':>12} {'mean':>8} {'max':>8} {'commands':>9}  ({cycles} cycles, {response_delay * 1000:.0f} ms response delay)")
+    for driver, baud, address, soi in DRIVERS:
+        settings, durations, commands = bench_refresh(driver, baud, address, soi, cycles, response_delay)
+        print(
+            f"{driver.__name__:<12} {settings[0]:13.3f}s {settings[1]:7.3f}s {min(durations):11.3f}s "
+            f"{sum(durations) / len(durations):7.3f}s {max(durations):7.3f}s {commands:9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
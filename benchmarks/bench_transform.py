@@ -0,0 +1,109 @@
+"""
+Micro-benchmark of DarenSNSBridge.transform_response on the sample frames in parse.py.
+
+"before" is the list-of-characters implementation the bridge used until the translation plan was compiled,
+"after" is the current transform_response. Logging is limited to warnings and the sampled diagnostic decoder
+is off (the bridge default), so only the translation itself is measured.
+
+Before measuring, the incrementally computed reply checksum is checked against a full calculate_checksum
+over a generated corpus of SNS frames with random payloads for every address.
+
+Usage: python benchmarks/bench_transform.py [seconds per run] [corpus size]
+"""
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from daren_sns_bridge import DAREN_CHECKSUM_OFFSET, DarenSNSBridge  # noqa: E402
+from parse import ho  # noqa: E402
+from protocol import calculate_checksum, decode_frame  # noqa: E402
+from utils import logger  # noqa: E402
+
+DURATION = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+CORPUS_SIZE = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+
+
+def legacy_transform_response(sns_response):
+    """transform_response as it was before the compiled translation plan, minus logging and printing."""
+    full_len = len(sns_response)
+    ho_payload_str = sns_response[13 : full_len - 5].decode("ascii")
+    if len(ho_payload_str) < 152:
+        return None
+    daren_payload_list = list("08FE" + ho_payload_str[4:152])
+    ho_cell_voltage_offsets = [(i * 4 + 12, i * 4 + 16) for i in range(16)]
+    daren_cell_voltage_offsets = [(34 + i * 4, 34 + i * 4 + 4) for i in range(16)]
+    for (ho_start, ho_end), (daren_start, daren_end) in zip(ho_cell_voltage_offsets, daren_cell_voltage_offsets):
+        daren_payload_list[daren_start:daren_end] = list(ho_payload_str[ho_start:ho_end])
+    static_mappings = {
+        (14, 18): (114, 118),
+        (18, 22): (124, 128),
+        (22, 26): (120, 124),
+        (26, 30): (120, 124),
+        (98, 102): (84, 88),
+        (102, 118): (90, 106),
+    }
+    for (daren_start, daren_end), (ho_start, ho_end) in static_mappings.items():
+        daren_payload_list[daren_start:daren_end] = list(ho_payload_str[ho_start:ho_end])
+    daren_payload_str = "".join(daren_payload_list)[4:152]
+    daren_payload_str = daren_payload_str[:-29] + "00000000001000000000003000000"
+    partial_frame = b"~" + b"22084A85F09808FE" + daren_payload_str.encode("ascii")
+    checksum = 0
+    for value in partial_frame[1:]:
+        checksum += value
+    frame_checksum = (checksum ^ 0xFFFF) + 1
+    return partial_frame + f"{frame_checksum:04X}".encode("ascii") + b"\r"
+
+
+def generated_frames(count, seed=1363):
+    """SNS frames with the header of the sample frame and a random hex payload, for random addresses."""
+    rng = random.Random(seed)
+    frame = ho.encode()
+    length = len(frame) - 18
+    for _ in range(count):
+        payload = b"%0*X" % (length, rng.getrandbits(4 * length))
+        yield bytes([rng.randrange(32)]), frame[:13] + payload + frame[-5:]
+
+
+def check_checksums(bridge, count):
+    """Compare the incremental checksum of every reply with a full calculate_checksum over the frame."""
+    for sns_addr, sns_response in generated_frames(count):
+        reply = bridge.transform_response(sns_response, sns_addr)
+        expected = b"%04X" % calculate_checksum(reply[1:DAREN_CHECKSUM_OFFSET])
+        if reply[DAREN_CHECKSUM_OFFSET : DAREN_CHECKSUM_OFFSET + 4] != expected:
+            raise SystemExit(f"checksum mismatch for address {sns_addr.hex()}: {reply}")
+        decode_frame(reply)
+    print(f"checksum: {count:,} generated replies match calculate_checksum")
+
+
+def frames_per_second(transform, frame):
+    count = 0
+    deadline = time.perf_counter() + DURATION
+    started = time.perf_counter()
+    while time.perf_counter() < deadline:
+        for _ in range(1000):
+            transform(frame)
+        count += 1000
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    logger.setLevel(logging.WARNING)
+    bridge = DarenSNSBridge(None, None, None, None, [b"\x08"])
+    frame = ho.encode()
+
+    if bridge.transform_response(frame) != legacy_transform_response(frame):
+        raise SystemExit("transform_response output differs from the legacy implementation")
+    check_checksums(bridge, CORPUS_SIZE)
+
+    before = frames_per_second(legacy_transform_response, frame)
+    after = frames_per_second(bridge.transform_response, frame)
+    print(f"before: {before:12,.0f} frames/s")
+    print(f"after:  {after:12,.0f} frames/s  ({after / before:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
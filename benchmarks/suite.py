@@ -0,0 +1,270 @@
+"""
+Benchmark suite for the protocol and translation hot paths, runnable without hardware.
+
+Every case runs on the recorded frames from parse.py and docs/daren_485_README.md plus synthetic variants
+of them (randomised cell voltages and current, valid checksums). The drivers read from a replay port that
+answers every command with the next frame of the case, so the drivers never wait for a response.
+
+For every case the suite reports operations per second and the bytes allocated per operation (peak traced
+by tracemalloc while a single operation runs), and compares them with benchmarks/baseline.json.
+
+Usage: python benchmarks/suite.py [--save] [--duration SECONDS] [--filter TEXT]
+
+--save writes the results as the new baseline, commit it together with the change that explains it.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bms"))
+
+from battery import Cell  # noqa: E402
+import daren_485  # noqa: E402
+import sns01_485  # noqa: E402
+from daren_sns_bridge import DarenSNSBridge  # noqa: E402
+from parse import dr, ho  # noqa: E402
+from protocol import decode_frame, encode_frame  # noqa: E402
+from protocol_client import SnsClient  # noqa: E402
+from realtime_data import decode_realtime_data  # noqa: E402
+from utils import logger, traffic_logger  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+SYNTHETIC_VARIANTS = 50
+REGRESSION_THRESHOLD = 10  # percent
+
+
+class ReplaySerial:
+    """
+    Stand-in for a serial port answering every write with the next recorded frame.
+    It has no file descriptor, readers fall back to polling `in_waiting`, which is never empty after a write.
+    """
+
+    def __init__(self, frames):
+        self.frames = [frame.encode() if isinstance(frame, str) else frame for frame in frames]
+        self.index = 0
+        self.pending = b""
+        self.is_open = True
+
+    def write(self, data):
+        self.pending = self.frames[self.index % len(self.frames)]
+        self.index += 1
+        return len(data)
+
+    @property
+    def in_waiting(self):
+        return len(self.pending)
+
+    def inWaiting(self):
+        return len(self.pending)
+
+    def read(self, size=1):
+        data, self.pending = self.pending[:size], self.pending[size:]
+        return data
+
+    def flush(self):
+        pass
+
+    def flushInput(self):
+        self.pending = b""
+
+    def flushOutput(self):
+        pass
+
+    reset_input_buffer = flushInput
+    reset_output_buffer = flushOutput
+
+
+def documented_frames():
+    """Recorded Service 42 responses from docs/daren_485_README.md."""
+    with open(os.path.join(ROOT, "docs", "daren_485_README.md"), encoding="utf-8") as f:
+        frames = re.findall(r"Response: `(~[0-9A-F]+)␍`", f.read())
+    return [frame + "\r" for frame in frames if frame[7:9] == "00" and len(frame) > 150]
+
+
+def synthetic_variants(frame, count, seed=1363):
+    """Variants of a Service 42 response with random cell voltages and current, re-encoded with a valid checksum."""
+    rng = random.Random(seed)
+    decoded = decode_frame(frame)
+    variants = []
+    for _ in range(count):
+        info = bytearray(decoded.info)
+        for i in range(16):
+            info[12 + i * 4 : 16 + i * 4] = b"%04X" % rng.randint(2800, 3650)  # cell voltage in mV
+        info[106:110] = b"%04X" % (rng.randint(-5000, 5000) & 0xFFFF)  # current in 10 mA
+        variants.append(encode_frame(decoded._replace(info=bytes(info))).decode())
+    return variants
+
+
+def bench_transform_response():
+    bridge = DarenSNSBridge(None, None, None, None, [b"\x08"])
+    frames = [frame.encode() for frame in [ho] + synthetic_variants(ho, SYNTHETIC_VARIANTS)]
+    state = {"i": 0}
+
+    def run():
+        state["i"] += 1
+        return bridge.transform_response(frames[state["i"] % len(frames)], b"\x08")
+
+    return run
+
+
+def bench_read_response():
+    client = SnsClient("/dev/null", 9600)
+    ser = ReplaySerial([ho] + synthetic_variants(ho, SYNTHETIC_VARIANTS))
+
+    def run():
+        ser.write(b"")
+        return client.read_response(ser)
+
+    return run
+
+
+def bench_create_command_v2():
+    battery = sns01_485.Daren485v2("/dev/null", 9600, b"\x08")
+    return battery.create_command_get_realtime_data
+
+
+def bench_create_command_v1():
+    battery = daren_485.Daren485("/dev/null", 19200, b"\x01")
+    return battery.create_command_get_mfg_params
+
+
+def with_cells(battery, cell_count=16):
+    """get_settings creates the cells before the first get_realtime_data"""
+    battery.cell_count = cell_count
+    battery.cells = [Cell(False) for _ in range(cell_count)]
+    return battery
+
+
+def bench_get_realtime_data_v2():
+    battery = with_cells(sns01_485.Daren485v2("/dev/null", 9600, b"\x08"))
+    ser = ReplaySerial([ho] + synthetic_variants(ho, SYNTHETIC_VARIANTS))
+    return lambda: battery.get_realtime_data(ser)
+
+
+def bench_get_realtime_data_v1():
+    battery = with_cells(daren_485.Daren485("/dev/null", 19200, b"\x01"))
+    frames = documented_frames() + [dr]
+    ser = ReplaySerial(frames + synthetic_variants(frames[0], SYNTHETIC_VARIANTS))
+    return lambda: battery.get_realtime_data(ser)
+
+
+def bench_decode_frame():
+    frames = [frame.encode() for frame in [ho, dr] + documented_frames()]
+    state = {"i": 0}
+
+    def run():
+        state["i"] += 1
+        return decode_frame(frames[state["i"] % len(frames)])
+
+    return run
+
+
+def bench_decode_realtime_data():
+    payloads = [frame[13:-5] for frame in [ho] + synthetic_variants(ho, SYNTHETIC_VARIANTS)]
+    state = {"i": 0}
+
+    def run():
+        state["i"] += 1
+        return decode_realtime_data(payloads[state["i"] % len(payloads)])
+
+    return run
+
+
+CASES = {
+    "transform_response": bench_transform_response,
+    "SnsClient.read_response": bench_read_response,
+    "Daren485v2.create_command": bench_create_command_v2,
+    "Daren485.create_command": bench_create_command_v1,
+    "Daren485v2.get_realtime_data": bench_get_realtime_data_v2,
+    "Daren485.get_realtime_data": bench_get_realtime_data_v1,
+    "protocol.decode_frame": bench_decode_frame,
+    "realtime_data.decode": bench_decode_realtime_data,
+}
+
+
+def operations_per_second(run, duration):
+    count = 0
+    started = time.perf_counter()
+    deadline = started + duration
+    while time.perf_counter() < deadline:
+        for _ in range(100):
+            run()
+        count += 100
+    return count / (time.perf_counter() - started)
+
+
+def bytes_per_operation(run, rounds=200):
+    tracemalloc.start()
+    try:
+        total = 0
+        for _ in range(rounds):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+            total += peak - before
+        return total / rounds
+    finally:
+        tracemalloc.stop()
+
+
+def change(current, baseline):
+    if not baseline:
+        return "      -"
+    return f"{(current - baseline) / baseline * 100:+6.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--save", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--duration", type=float, default=1.0, help="seconds per case")
+    parser.add_argument("--filter", default="", help="only run cases containing this text")
+    args = parser.parse_args()
+
+    logger.setLevel(logging.CRITICAL)
+    traffic_logger.setLevel(logging.CRITICAL + 1)
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results = {}
+    regressions = []
+    print(f"{'case':<30} {'ops/s':>12} {'vs base':>8} {'B/op':>10} {'vs base':>8}")
+    for name, setup in CASES.items():
+        if args.filter not in name:
+            continue
+        run = setup()
+        if not run():
+            raise SystemExit(f"{name} returned no result, the benchmark input is broken")
+        ops = operations_per_second(run, args.duration)
+        allocated = bytes_per_operation(run)
+        results[name] = {"ops_per_sec": round(ops, 1), "bytes_per_op": round(allocated, 1)}
+
+        base = baseline.get(name, {})
+        print(f"{name:<30} {ops:12,.0f} {change(ops, base.get('ops_per_sec'))} {allocated:10,.0f} {change(allocated, base.get('bytes_per_op'))}")
+        if base.get("ops_per_sec") and ops < base["ops_per_sec"] * (1 - REGRESSION_THRESHOLD / 100):
+            regressions.append(name)
+
+    if regressions:
+        print(f"\nSlower than the baseline by more than {REGRESSION_THRESHOLD}%: {', '.join(regressions)}")
+
+    if args.save:
+        baseline.update(results)
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nBaseline written to {BASELINE_PATH}")
+
+
+if __name__ == "__main__":
+    main()
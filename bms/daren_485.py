@@ -8,9 +8,12 @@
 
 # avoid importing wildcards, remove unused imports
 from battery import Battery, Cell
-from utils import open_serial_port, logger
-from time import sleep
-from struct import unpack
+from utils import logger, DAREN_CAP_PARAMS_EVERY_POLLS, DAREN_CELL_PARAMS_EVERY_MINUTES
+from static_info_cache import StaticInfoCache, static_info_cache
+from protection_decoder import apply_protection
+from realtime_data import REALTIME_DATA_LENGTH, decode_realtime_data
+from protocol_client import DarenClient
+from time import monotonic
 from re import findall
 import sys
 
@@ -24,6 +27,11 @@ class Daren485(Battery):
         # to address reflecting the position of the DIP-switches on the unit(s), starting at '01'.
         self.address = address
         self.serial_number = ""
+        self.client = DarenClient(port, baud)  # port and command/response exchange, no battery state
+        # refresh_data reads the realtime data on every poll, the slowly changing params only when due
+        self.polls_since_cap_params = None  # None until the first successful read
+        self.cells_params_read_at = None  # monotonic() time of the last successful read
+        self.cells_params_fet_state = None  # (charge_fet, discharge_fet) at the last successful read
         self.history.exclude_values_to_calculate = ["charge_cycles", "total_ah_drawn", "charged_energy", "discharged_energy"]
 
     BATTERYTYPE = "Daren485"
@@ -71,24 +79,45 @@ class Daren485(Battery):
         """
         result = False
         try:
-            with open_serial_port(self.port, self.baud_rate) as ser:
+            with self.client.connection() as ser:
                 if ser:
                     if ser.is_open:
+                        cache_key = StaticInfoCache.key(self.BATTERYTYPE, self.port, self.address)
+                        cached = static_info_cache.get(cache_key)
+
+                        # the serial number identifies the module, it is read on every start-up
                         result = self.get_serial(ser)
 
-                        result = result and self.get_cells_params(ser)
+                        if result and cached is not None and cached["serial_number"] == self.serial_number:
+                            # same module as before, the cached static info replaces the remaining commands.
+                            # refresh_data reads the realtime data, cells params and cap params on its first poll.
+                            self.hardware_version = cached["hardware_version"]
+                            self.cell_count = cached["cell_count"]
+                            logger.info(f"get_settings: serial {self.serial_number} matches the cache, skipping the static info")
+                            self.init_cells()
+                        else:
+                            if result and cached is not None:
+                                logger.info(f"get_settings: serial {self.serial_number} does not match the cached {cached['serial_number']}, reading all settings")
+                                static_info_cache.invalidate(cache_key)
+
+                            result = result and self.get_cells_params(ser)
 
-                        if result:
-                            # init the cell array once
-                            if len(self.cells) == 0:
-                                for _ in range(self.cell_count):
-                                    self.cells.append(Cell(False))
+                            if result:
+                                self.init_cells()
 
-                        result = result and self.get_realtime_data(ser)
+                            result = result and self.get_realtime_data(ser)
 
-                        result = result and self.get_manufacturer_info(ser)
+                            result = result and self.get_manufacturer_info(ser)
 
-                        result = result and self.get_cap_params(ser)
+                            result = result and self.get_cap_params(ser)
+
+                            if result:
+                                static_info_cache.put(
+                                    cache_key,
+                                    serial_number=self.serial_number,
+                                    hardware_version=self.hardware_version,
+                                    cell_count=self.cell_count,
+                                )
                     else:
                         logger.error("Error opening serialport!")
                 else:
@@ -103,6 +132,14 @@ class Daren485(Battery):
 
         return result
 
+    def init_cells(self):
+        """
+        Init the cell array once, after the cell count is known.
+        """
+        if len(self.cells) == 0:
+            for _ in range(self.cell_count):
+                self.cells.append(Cell(False))
+
     def refresh_data(self):
         """
         call all functions that will refresh the battery data.
@@ -111,7 +148,7 @@ class Daren485(Battery):
         """
         result = False
         try:
-            with open_serial_port(self.port, self.baud_rate) as ser:
+            with self.client.connection() as ser:
                 if ser:
                     if ser.is_open:
                         result = self.get_realtime_data(ser)
@@ -119,9 +156,15 @@ class Daren485(Battery):
                         # get cells_params to get max (dis)charge params,
                         # but use the FET status registers from realtime data
                         # to set them to 0 when needed.
-                        result = result and self.get_cells_params(ser)
+                        # Both params change slowly, between their reads the values of the last read are kept.
+                        if result and self.cells_params_due():
+                            result = self.get_cells_params(ser)
+
+                        if result and self.cap_params_due():
+                            result = self.get_cap_params(ser)
 
-                        result = result and self.get_cap_params(ser)
+                        if self.polls_since_cap_params is not None:
+                            self.polls_since_cap_params += 1
                     else:
                         logger.error("Error opening serialport!")
                 else:
@@ -135,6 +178,23 @@ class Daren485(Battery):
 
         return result
 
+    def cells_params_due(self):
+        """
+        The cells params are read on start-up, when a FET changed state since the last read
+        (the charge limits depend on it) and every DAREN_CELL_PARAMS_EVERY_MINUTES.
+        """
+        return (
+            self.cells_params_read_at is None
+            or self.cells_params_fet_state != (self.charge_fet, self.discharge_fet)
+            or monotonic() - self.cells_params_read_at >= DAREN_CELL_PARAMS_EVERY_MINUTES * 60
+        )
+
+    def cap_params_due(self):
+        """
+        The capacity params are read on start-up and every DAREN_CAP_PARAMS_EVERY_POLLS polls.
+        """
+        return self.polls_since_cap_params is None or self.polls_since_cap_params >= DAREN_CAP_PARAMS_EVERY_POLLS
+
     def get_serial(self, ser):
         """
         Read serial from device by calling the get_mfg_params command,
@@ -144,14 +204,8 @@ class Daren485(Battery):
 
         req = self.create_command_get_mfg_params()
 
-        ser.flushOutput()
-        ser.flushInput()
-        ser.write(req.encode())
-        logger.debug("get_mfg_params request sent: {}".format(req))
-
-        sleep(1.5)  # Allow the BMS some time to send a full response
-
-        response = self.read_response(ser)
+        # wait for the complete response, at most 1.5 s
+        response = self.client.exchange(ser, req, timeout=1.5, name="get_mfg_params")
 
         if response:
             # Payload starts at offset 13(packet header) + 12 (command_info)
@@ -178,14 +232,8 @@ class Daren485(Battery):
 
         req = self.create_command_get_cap_params()
 
-        ser.flushOutput()
-        ser.flushInput()
-        ser.write(req.encode())
-        logger.debug("get_cap_params request sent: {}".format(req))
-
-        sleep(1.5)  # Allow the BMS some time to send a full response
-
-        response = self.read_response(ser)
+        # wait for the complete response, at most 1.5 s
+        response = self.client.exchange(ser, req, timeout=1.5, name="get_cap_params")
 
         if response:
             # Payload starts at offset 13(packet header) + 12 (command_info)
@@ -200,6 +248,7 @@ class Daren485(Battery):
                 self.history.charged_energy = int(int(payload[28:32], base=16) / 10)
                 self.history.discharged_energy = int(int(payload[32:36], base=16) / 10)
 
+                self.polls_since_cap_params = 0
                 result = True
             else:
                 logger.error("get_cap_params response length error!")
@@ -218,179 +267,40 @@ class Daren485(Battery):
 
         req = self.create_command_get_realtime_data()
 
-        ser.flushOutput()
-        ser.flushInput()
-        ser.write(req.encode())
-        logger.debug("get_realtime_data request sent: {}".format(req))
-
-        sleep(1.5)  # Allow the BMS some time to send a full response
-
-        response = self.read_response(ser)
+        # wait for the complete response, at most 1.5 s
+        response = self.client.exchange(ser, req, timeout=1.5, name="get_realtime_data")
 
         if response:
             payload = response[13 : len(response) - 5]
-            if len(payload) >= 118:
-                self.soc = int(payload[2:6], base=16) / 100
-                self.voltage = int(payload[6:10], base=16) / 100
-                self.current = unpack(">h", bytes.fromhex(payload[106:110]))[0] / 100
-                temperature_mos = unpack(">h", bytes.fromhex(payload[84:88]))[0] / 10
-                self.to_temperature(0, temperature_mos)
-                temperature_1 = unpack(">h", bytes.fromhex(payload[90:94]))[0] / 10
-                self.to_temperature(1, temperature_1)
-                temperature_2 = unpack(">h", bytes.fromhex(payload[94:98]))[0] / 10
-                self.to_temperature(2, temperature_2)
-                temperature_3 = unpack(">h", bytes.fromhex(payload[98:102]))[0] / 10
-                self.to_temperature(3, temperature_3)
-                temperature_4 = unpack(">h", bytes.fromhex(payload[102:106]))[0] / 10
-                self.to_temperature(4, temperature_4)
-                self.capacity = int(payload[120:124], base=16) / 100
-                self.capacity_remaining = int(payload[124:128], base=16) / 100
-                self.history.charge_cycles = int(payload[128:132], base=16)
-                fetstatus = int(payload[148:152], base=16)
-
-                voltagestatus = int(payload[132:136], base=16)
-                currentstatus = int(payload[136:140], base=16)
-                temperaturestatus = int(payload[140:144], base=16)
-                warningstatus = int(payload[144:148], base=16)
-
-                # check bit 2 for TOT_OVV_PROT and bit 0 for cell_OVV_PROT
-                if voltagestatus & (1 << 2) or voltagestatus & (1 << 0):
-                    self.protection.high_voltage = 2
-                # check bit 6 for TOT_OVV_alarm and 4 for cell_OVV_alarm
-                elif voltagestatus & (1 << 6) or voltagestatus & (1 << 4):
-                    self.protection.high_voltage = 1
-                else:
-                    self.protection.high_voltage = 0
-                # NOTE: high_voltage_cell not implemented.
-                # Now incorporated in voltage_high alarm.
-                # Split if high_voltage_cell ever implemented.
-
-                # check bit 3 for TOT_UNDV_PROT
-                if voltagestatus & (1 << 3):
-                    self.protection.low_voltage = 2
-                # check bit 7 for TOT_UNDV_alarm
-                elif voltagestatus & (1 << 7):
-                    self.protection.low_voltage = 1
-                else:
-                    self.protection.low_voltage = 0
-
-                # check bit 1 for cell_UNDV_PROT
-                if voltagestatus & (1 << 1):
-                    self.protection.low_cell_voltage = 2
-                # check bit 5 for cell_UNDV_alarm
-                elif voltagestatus & (1 << 5):
-                    self.protection.low_cell_voltage = 1
-                else:
-                    self.protection.low_cell_voltage = 0
-
-                # check bit 7 for low_BAT_alarm from warningstatus
-                if warningstatus & (1 << 7):
-                    self.protection.low_soc = 2
-                else:
-                    self.protection.low_soc = 0
-
-                # check bit 2 for CHG_OC_PROT
-                if currentstatus & (1 << 2):
-                    self.protection.high_charge_current = 2
-                # check bit 6 for CHG_C_alarm
-                elif currentstatus & (1 << 6):
-                    self.protection.high_charge_current = 1
-                else:
-                    self.protection.high_charge_current = 0
-
-                # check bit 4 for DISCH_OC_1_PROT, bit 5 for DISCH_OC_2_PROT and bit 3 for Short_circuit_PROT
-                if currentstatus & (1 << 4) or currentstatus & (1 << 5) or currentstatus & (1 << 3):
-                    self.protection.high_discharge_current = 2
-                # check bit 7 for DISCH_C_alarm
-                elif currentstatus & (1 << 7):
-                    self.protection.high_discharge_current = 1
-                else:
-                    self.protection.high_discharge_current = 0
-
-                # check bit 14 for V_DIF_PROT
-                if voltagestatus & (1 << 14):
-                    self.protection.cell_imbalance = 2
-                # check bit 8 for V_DIF_ALARM
-                elif voltagestatus & (1 << 8):
-                    self.protection.cell_imbalance = 1
-                else:
-                    self.protection.cell_imbalance = 0
-
-                # if something else is in warning, report internal failure. warningstatus
-                # contains all sorts of internal components, such as CHG_FET, NTC_fail,
-                # cell_fail, chg_mos_fail, disch_mos_fail, etc.
-                # Ignore V_DIF_alarm and low_BAT_alarm flags, since we're allready checking for those.
-                if (warningstatus & 0b01111110) > 0:
-                    self.protection.internal_failure = 2
-                else:
-                    self.protection.internal_failure = 0
-
-                # check bit 0 for CHG_H_TEMP_PROT
-                if temperaturestatus & (1 << 0):
-                    self.protection.high_charge_temperature = 2
-                # check bit 8 for CHG_H_TEMP_alarm
-                elif temperaturestatus & (1 << 8):
-                    self.protection.high_charge_temperature = 1
-                else:
-                    self.protection.high_charge_temperature = 0
-
-                # check bit 1 for CHG_L_TEMP_PROT
-                if temperaturestatus & (1 << 1):
-                    self.protection.low_charge_temperature = 2
-                # check bit 9 for CHG_L_TEMP_alarm
-                elif temperaturestatus & (1 << 9):
-                    self.protection.low_charge_temperature = 1
-                else:
-                    self.protection.low_charge_temperature = 0
-
-                # check bit 0 for CHG_H_TEMP_PROT and bit 2 for DISCH_H_TEMP_PROT
-                if temperaturestatus & (1 << 0) or temperaturestatus & (1 << 2):
-                    self.protection.high_temperature = 2
-                # check bit 8 for CHG_H_TEMP_alarm and bit 10 for DISCH_H_TEMP_alarm
-                elif temperaturestatus & (1 << 8) or temperaturestatus & (1 << 10):
-                    self.protection.high_temperature = 1
-                else:
-                    self.protection.high_temperature = 0
-
-                # check bit 1 for CHG_L_TEMP_PROT and bit 3 for DISCH_L_TEMP_PROT
-                if temperaturestatus & (1 << 1) or temperaturestatus & (1 << 3):
-                    self.protection.low_temperature = 2
-                # check bit 9 for CHG_L_TEMP_alarm and bit 11 for DISCH_L_TEMP_alarm
-                elif temperaturestatus & (1 << 9) or temperaturestatus & (1 << 11):
-                    self.protection.low_temperature = 1
-                else:
-                    self.protection.low_temperature = 0
-
-                # check bit 6 for MOS_H_TEMP_PROT and 4 for ENV_H_TEMP_PROT
-                if temperaturestatus & (1 << 6) or temperaturestatus & (1 << 4):
-                    self.protection.high_internal_temperature = 2
-                # check bit 14 for MOS_H_TEMP_alarm and 12 for ENV_H_TEMP_alarm
-                elif temperaturestatus & (1 << 14) or temperaturestatus & (1 << 12):
-                    self.protection.high_internal_temperature = 1
-                else:
-                    self.protection.high_internal_temperature = 0
-
-                # check bit 13 for blown_fuse from voltagestatus
-                if voltagestatus & (1 << 13):
-                    self.protection.fuse_blown = 2
-                else:
-                    self.protection.fuse_blown = 0
-
-                if fetstatus & (1 << 0):
+            if len(payload) >= REALTIME_DATA_LENGTH:
+                data = decode_realtime_data(payload)
+                self.soc = data.soc
+                self.voltage = data.voltage
+                self.current = data.current
+                self.to_temperature(0, data.temperature_mos)
+                for i, temperature in enumerate(data.temperatures, 1):
+                    self.to_temperature(i, temperature)
+                self.capacity = data.capacity
+                self.capacity_remaining = data.capacity_remaining
+                self.history.charge_cycles = data.charge_cycles
+
+                # alarms and warnings from the status words, see protection_decoder.PROTECTION_BITS
+                apply_protection(self.protection, data.voltage_status, data.current_status, data.temperature_status, data.warning_status)
+
+                if data.fet_status & (1 << 0):
                     self.charge_fet = True
                 else:
                     self.charge_fet = False
                     self.max_battery_charge_current = 0
 
-                if fetstatus & (1 << 1):
+                if data.fet_status & (1 << 1):
                     self.discharge_fet = True
                 else:
                     self.discharge_fet = False
                     self.max_battery_discharge_current = 0
 
-                for i in range(1, 17):
-                    cell_voltage = int(payload[(i - 1) * 4 + 12 : i * 4 + 12], base=16) / 1000
-                    self.cells[i - 1].voltage = cell_voltage
+                for cell, cell_voltage in zip(self.cells, data.cell_voltages):
+                    cell.voltage = cell_voltage
 
                 result = True
             else:
@@ -409,14 +319,8 @@ class Daren485(Battery):
 
         req = self.create_command_get_manufacturer_info()
 
-        ser.flushOutput()
-        ser.flushInput()
-        ser.write(req.encode())
-        logger.debug("get_manufacturer_info request sent: {}".format(req))
-
-        sleep(1.5)  # Allow the BMS some time to send a full response
-
-        response = self.read_response(ser)
+        # wait for the complete response, at most 1.5 s
+        response = self.client.exchange(ser, req, timeout=1.5, name="get_manufacturer_info")
 
         if response:
             payload = response[13 : len(response) - 5]
@@ -456,14 +360,8 @@ class Daren485(Battery):
 
         req = self.create_command_get_cells_params()
 
-        ser.flushOutput()
-        ser.flushInput()
-        ser.write(req.encode())
-        logger.debug("get_cells_params request sent: {}".format(req))
-
-        sleep(1.5)  # Allow the BMS some time to send a full response
-
-        response = self.read_response(ser)
+        # wait for the complete response, at most 1.5 s
+        response = self.client.exchange(ser, req, timeout=1.5, name="get_cells_params")
 
         if response:
             payload = response[13 : len(response) - 5]
@@ -495,6 +393,8 @@ class Daren485(Battery):
                 else:
                     self.max_battery_discharge_current = 0
 
+                self.cells_params_read_at = monotonic()
+                self.cells_params_fet_state = (self.charge_fet, self.discharge_fet)
                 result = True
             else:
                 logger.error("get_cells_params response length error!")
@@ -503,65 +403,6 @@ class Daren485(Battery):
 
         return result
 
-    def read_response(self, ser):
-        """
-        After sending the command to the device, this service processes
-        the receive buffer and performs basic parsing and validation of received data.
-        """
-        buff = ""
-
-        while ser.inWaiting() > 0:
-            try:
-                chr = ser.read()
-                buff += chr.decode()
-                if chr == b"\r":
-                    break
-            except Exception as e:
-                logger.error("Exception during inWaiting(): {}".format(e))
-                pass
-
-        try:
-            CID2 = buff[7:9]
-            if self.CID2_decode(CID2) == -1:
-                logger.debug("CID2_Decode error!")
-                logger.debug("Buffer contents: {}".format(buff))
-                return False
-        except Exception as e:
-            logger.error("read_response Data invalid!: {}".format(e))
-            logger.error("Received data: {}".format(buff))
-            return False
-
-        logger.debug("Received data: {}".format(buff))
-
-        try:
-            LENID = int(buff[9:13], base=16)
-            length = LENID & 0x0FFF
-            if self.length_checksum(length) == LENID:
-                logger.debug("Data length ok.")
-            else:
-                logger.error("Data length error.")
-                return False
-        except Exception as e:
-            logger.error("Exception during data length check: {}".format(e))
-            logger.error("Received data: {}".format(buff))
-            return False
-
-        try:
-            chksum = int(buff[len(buff) - 5 :], base=16)
-            calculated_chksum = self.calculate_checksum(buff[1 : len(buff) - 5])
-            if calculated_chksum == chksum:
-                logger.debug("Checksum ok.")
-            else:
-                logger.error("Checksum error. Calculated: {}, Received: {}".format(calculated_chksum, chksum))
-                return False
-
-        except Exception as e:
-            logger.error("Exception during checksum calculation: {}".format(e))
-            return False
-
-        logger.debug("read_response Data valid!")
-        return buff
-
     def create_command_get_cells_params(self):
         """
         Generates command that utilizes Service 47 of the BMS.
@@ -617,63 +458,4 @@ class Daren485(Battery):
         return self.create_command(self.address, b"\x4A", b"\x51")
 
     def create_command(self, addr, cid1, cid2, info=""):
-        command = ""
-        command += "~"  # B1=SOI
-        command += "22"  # B2=Version
-        command += addr.hex().upper()  # B3=ADDR
-        command += cid1.hex().upper()  # B4=CID1
-        command += cid2.hex().upper()  # B5=CID2
-
-        if len(info) > 0:
-            length = len(info)
-            length = self.length_checksum(length)
-            command += format(length, "x").upper()
-            command += info
-        else:
-            command += "0000"  # Length = 0, LenID=0, Lchecksum=0
-        checksum = self.calculate_checksum(command[1 : len(command)])
-
-        command += format(checksum, "x").upper()
-        command += "\r"  # Last Byte=EOI, \r
-
-        # logger.info("Command: {}".format(command))
-        return command
-
-    def calculate_checksum(self, str):
-        checksum = 0
-        for value in str:
-            checksum = checksum + ord(value)
-        checksum = checksum ^ 0xFFFF
-        return checksum + 1
-
-    # creates length + checksum from length val in two byte integer
-    def length_checksum(self, value):
-        value = value & 0x0FFF
-        n1 = value & 0xF
-        n2 = (value >> 4) & 0xF
-        n3 = (value >> 8) & 0xF
-        chksum = ((n1 + n2 + n3) & 0xF) ^ 0xF
-        chksum = chksum + 1
-        return value + (chksum << 12)
-
-    def CID2_decode(self, CID2):
-        if CID2 == "00":
-            logger.debug("CID2 response ok.")
-            return 0
-        elif CID2 == "01":
-            logger.error("VER error.")
-        elif CID2 == "02":
-            logger.error("CHKSUM error.")
-        elif CID2 == "03":
-            logger.error("LCHKSUM error.")
-        elif CID2 == "04":
-            logger.error("CID2 invalid.")
-        elif CID2 == "05":
-            logger.error("Command format error.")
-        elif CID2 == "06":
-            logger.error("INFO data invalid.")
-        elif CID2 == "90":
-            logger.error("ADR error.")
-        elif CID2 == "91":
-            logger.error("Battery communication error.")
-        return -1
+        return self.client.create_command(addr[0], cid1[0], cid2[0], info).decode()
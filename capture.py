@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+Binary capture of serial traffic and replay of captures through the bridge.
+
+A capture starts with CAPTURE_MAGIC and the wall clock time of the start, followed by records:
+
+    P  port id (B)  name length (H)  name (UTF-8)                        declares a port
+    D  timestamp (d)  port id (B)  direction (B)  length (I)  raw bytes  one chunk of traffic
+
+Timestamps are monotonic seconds since the start of the capture, direction is RX (received by the capturing
+side) or TX (sent by it).
+
+Usage:
+    python capture.py dump <capture>
+    python capture.py replay <capture> [--port NAME] [--speed 1|10|max] [--sns-delay 0.05]
+
+replay feeds the Service 42 polls captured on a port (default: the first port) into an in-process bridge through
+a pty, with the SNS side answered by the simulator, and reports replies, timeouts and reply latency.
+"""
+import argparse
+import struct
+import threading
+from time import monotonic, sleep, time
+from typing import BinaryIO, Dict, Iterator, List, NamedTuple, Union
+
+from protocol import FrameError, decode_frame
+
+
+CAPTURE_MAGIC = b"DSCAP1\n"
+RX = 0
+TX = 1
+DIRECTIONS = ("RX", "TX")
+
+_START = struct.Struct(">d")
+_PORT = struct.Struct(">cBH")
+_DATA = struct.Struct(">cdBBI")
+
+
+class CaptureRecord(NamedTuple):
+    """
+    One chunk of captured traffic.
+    """
+
+    timestamp: float
+    port: str
+    direction: int
+    data: bytes
+
+
+class CaptureWriter:
+    """
+    Thread-safe writer of a capture. The file stays open for the whole capture, records are buffered.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: File to create, an existing file is overwritten
+        """
+        self.path = path
+        self._file: BinaryIO = open(path, "wb")
+        self._file.write(CAPTURE_MAGIC + _START.pack(time()))
+        self._started_at = monotonic()
+        self._ports: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def write(self, port: str, direction: int, data: bytes, timestamp: Union[float, None] = None) -> None:
+        """
+        Record a chunk of traffic.
+
+        :param port: Name of the port, e.g. `/dev/ttyUSB0`
+        :param direction: RX or TX
+        :param data: Raw bytes
+        :param timestamp: monotonic() timestamp of the chunk, defaults to now
+        """
+        at = (monotonic() if timestamp is None else timestamp) - self._started_at
+        with self._lock:
+            port_id = self._ports.get(port)
+            if port_id is None:
+                port_id = self._ports[port] = len(self._ports)
+                name = port.encode()
+                self._file.write(_PORT.pack(b"P", port_id, len(name)) + name)
+            self._file.write(_DATA.pack(b"D", at, port_id, direction, len(data)) + data)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def read_capture(path: str) -> Iterator[CaptureRecord]:
+    """
+    Read the records of a capture.
+
+    :param path: Capture file
+    :return: Records in the order they were captured
+    """
+    ports: Dict[int, str] = {}
+    with open(path, "rb") as f:
+        if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError(f"{path} is not a capture file")
+        f.read(_START.size)
+        while True:
+            kind = f.read(1)
+            if not kind:
+                return
+            if kind == b"P":
+                port_id, length = struct.unpack(">BH", f.read(_PORT.size - 1))
+                ports[port_id] = f.read(length).decode()
+            elif kind == b"D":
+                timestamp, port_id, direction, length = struct.unpack(">dBBI", f.read(_DATA.size - 1))
+                data = f.read(length)
+                if len(data) < length:
+                    return  # capture cut off while writing
+                yield CaptureRecord(timestamp, ports[port_id], direction, data)
+            else:
+                raise ValueError(f"unknown record type {kind!r} in {path}")
+
+
+def master_requests(records: Iterator[CaptureRecord], port: Union[str, None] = None) -> List[CaptureRecord]:
+    """
+    Reassemble the frames received on a port and keep the Service 42 polls of the master, the requests the bridge
+    answers. Replies of other slaves on the same bus, other commands and corrupt frames are dropped.
+
+    :param records: Capture records
+    :param port: Port to use, defaults to the first port in the capture
+    :return: One record per request frame, timestamped with the chunk that completed it
+    """
+    requests = []
+    buffer = b""
+    for record in records:
+        if port is None:
+            port = record.port
+        if record.port != port or record.direction != RX:
+            continue
+        buffer += record.data
+        while b"\r" in buffer:
+            frame, buffer = buffer.split(b"\r", 1)
+            frame += b"\r"
+            start = max(frame.rfind(b"~"), frame.rfind(b">"))  # drop noise in front of the SOI
+            try:
+                decoded = decode_frame(frame[start:])
+            except FrameError:
+                continue
+            if decoded.cid2 == 0x42:
+                requests.append(record._replace(data=frame[start:]))
+    return requests
+
+
+def replay(requests: List[CaptureRecord], speed: Union[float, None], sns_delay: float = 0.05, reply_timeout: float = 0.5, bridge_kwargs: Union[dict, None] = None) -> Dict:
+    """
+    Replay master requests into an in-process bridge, its SNS side answered by the simulator.
+
+    :param requests: Request frames, e.g. from master_requests
+    :param speed: Speed factor relative to the capture, None sends each request as soon as the previous one is answered
+    :param sns_delay: Response delay of the simulated SNS modules
+    :param reply_timeout: Seconds to wait for a reply to a request
+    :param bridge_kwargs: Additional arguments of DarenSNSBridge
+    :return: Statistics of the replay
+    """
+    from daren_sns_bridge import DarenSNSBridge
+    from metrics import Histogram
+    from simulator import PtyPort, SnsSlaveSimulator
+    from utils import FrameReader
+
+    addresses = sorted({decode_frame(request.data).adr for request in requests})
+    master = PtyPort(19200)
+    slaves = SnsSlaveSimulator(addresses, 9600, sns_delay)
+    bridge = DarenSNSBridge(master.port, slaves.port, 19200, 9600, [bytes([address]) for address in addresses], **(bridge_kwargs or {}))
+    slaves.start()
+    bridge.start()
+    sleep(0.5)  # let the bridge open its ports
+
+    latency = Histogram()
+    stats = {"requests": 0, "replies": 0, "timeouts": 0}
+    reader = FrameReader(master)
+    pending: Dict[int, float] = {}  # address -> time the request was sent
+
+    def collect(timeout):
+        reply = reader.read_frame(timeout)
+        if reply is None:
+            return False
+        try:
+            sent_at = pending.pop(decode_frame(reply).adr, None)
+        except FrameError:
+            return True
+        if sent_at is not None:
+            latency.observe(monotonic() - sent_at)
+            stats["replies"] += 1
+        return True
+
+    started = monotonic()
+    first = requests[0].timestamp if requests else 0.0
+    for request in requests:
+        if speed is not None:
+            due = started + (request.timestamp - first) / speed
+            while monotonic() < due:
+                collect(max(0.0, due - monotonic()))
+        address = decode_frame(request.data).adr
+        if address in pending:
+            stats["timeouts"] += 1  # the next request for the address was due before the reply arrived
+        master.write(request.data)
+        pending[address] = monotonic()
+        stats["requests"] += 1
+        if speed is None:
+            deadline = monotonic() + reply_timeout
+            while address in pending and monotonic() < deadline:
+                collect(deadline - monotonic())
+
+    deadline = monotonic() + reply_timeout
+    while pending and monotonic() < deadline:
+        collect(deadline - monotonic())
+    stats["timeouts"] += len(pending)
+    elapsed = monotonic() - started
+
+    bridge.stop()
+    slaves.stop()
+    master.close()
+    slaves.close()
+    stats.update(
+        elapsed=elapsed,
+        rate=stats["requests"] / elapsed if elapsed > 0 else 0.0,
+        latency=latency.describe(),
+    )
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dump or replay traffic captures")
+    commands = parser.add_subparsers(dest="command", required=True)
+    dump_parser = commands.add_parser("dump", help="print the records of a capture")
+    dump_parser.add_argument("capture")
+    replay_parser = commands.add_parser("replay", help="replay the master requests of a capture through the bridge")
+    replay_parser.add_argument("capture")
+    replay_parser.add_argument("--port", default=None, help="captured port with the master requests, default: the first one")
+    replay_parser.add_argument("--speed", default="1", help="speed factor, e.g. 1 or 10, or max")
+    replay_parser.add_argument("--sns-delay", type=float, default=0.05, help="seconds before an SNS module starts to answer")
+    replay_parser.add_argument("--prefetch-interval", type=float, default=None, help="bridge prefetch interval in seconds")
+    args = parser.parse_args()
+
+    if args.command == "dump":
+        for record in read_capture(args.capture):
+            print(f"{record.timestamp:12.6f} {record.port} {DIRECTIONS[record.direction]} {record.data!r}")
+        return
+
+    requests = master_requests(read_capture(args.capture), args.port)
+    if not requests:
+        raise SystemExit(f"No master requests found in {args.capture}")
+    speed = None if args.speed == "max" else float(args.speed)
+    stats = replay(requests, speed, args.sns_delay, bridge_kwargs={"prefetch_interval": args.prefetch_interval})
+    print(
+        f"{stats['requests']} requests in {stats['elapsed']:.2f} s ({stats['rate']:.1f}/s), "
+        f"{stats['replies']} replies, {stats['timeouts']} timeouts, latency {stats['latency']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
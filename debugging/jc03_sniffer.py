@@ -1,6 +1,13 @@
-import serial
-import time
+import os
+import sys
 import threading
+import time
+
+import serial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from capture import RX, CaptureWriter  # noqa: E402
 
 # Configuration
 MASTER_SLAVE_PORT = "/dev/ttyUSB0"  # JC03 master-slave communication
@@ -8,58 +15,66 @@ HO01_PORT = "/dev/ttyUSB1"         # Ho01 communication
 BAUD_MASTER_SLAVE = 19200
 BAUD_HO01 = 9600
 TIMEOUT = 1
-LOG_FILE = "communication_sniff.log"
+CAPTURE_FILE = "communication_sniff.cap"  # read with `python capture.py dump` or replay with `python capture.py replay`
+PRINT_TRAFFIC = True  # also print every chunk to the console
 
-def log_message(file, source, direction, data):
-    """
-    Logs a message to the log file with source, direction, and timestamp.
-    """
-    timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-    with open(file, "a") as log:
-        log.write(f"[{timestamp}] {source} {direction}: {data}\n")
-    print(f"[{timestamp}] {source} {direction}: {data}")
 
-def sniff_port(port, baud, source, log_file):
+def sniff_port(port, baud, source, capture):
     """
-    Sniffs traffic on a specified serial port.
+    Sniffs traffic on a specified serial port and records the raw chunks with their timestamps.
     """
     try:
         with serial.Serial(port, baud, timeout=TIMEOUT) as ser:
             print(f"Listening on {port} ({source})...")
             while True:
+                # block for the first byte, then take everything that arrived with it
+                data = ser.read(1)
+                if not data:
+                    continue
+                received_at = time.monotonic()
                 if ser.in_waiting:
-                    data = ser.read(ser.in_waiting)
-                    log_message(log_file, source, "RX", data)
+                    data += ser.read(ser.in_waiting)
+                capture.write(port, RX, data, received_at)
+                if PRINT_TRAFFIC:
+                    print(f"{received_at:.6f} {source} RX: {data}")
     except KeyboardInterrupt:
         print(f"Exiting {source} sniffing...")
     except Exception as e:
         print(f"Error on {source}: {e}")
 
+
 def main():
     """
     Main function to start sniffing on both USB0 and USB1.
     """
-    try:
-        # Start sniffing on JC03 master-slave communication
-        master_slave_thread = threading.Thread(
-            target=sniff_port,
-            args=(MASTER_SLAVE_PORT, BAUD_MASTER_SLAVE, "JC03 Message", LOG_FILE),
-            daemon=True
-        )
+    with CaptureWriter(CAPTURE_FILE) as capture:
+        try:
+            # Start sniffing on JC03 master-slave communication
+            master_slave_thread = threading.Thread(
+                target=sniff_port,
+                args=(MASTER_SLAVE_PORT, BAUD_MASTER_SLAVE, "JC03 Message", capture),
+                daemon=True
+            )
+            ho01_thread = threading.Thread(
+                target=sniff_port,
+                args=(HO01_PORT, BAUD_HO01, "Ho01 Message", capture),
+                daemon=True
+            )
 
-        # Start threads
-        master_slave_thread.start()
-        # ho01_thread.start()
+            # Start threads
+            master_slave_thread.start()
+            ho01_thread.start()
 
-        # Keep main thread alive
-        print("Sniffing on USB0 (JC03) and USB1 (Ho01). Press Ctrl+C to stop.")
-        while True:
-            time.sleep(1)
+            # Keep main thread alive, flushing the capture once a second
+            print(f"Sniffing on USB0 (JC03) and USB1 (Ho01) into {CAPTURE_FILE}. Press Ctrl+C to stop.")
+            while True:
+                time.sleep(1)
+                capture.flush()
 
-    except KeyboardInterrupt:
-        print("Exiting sniffing...")
-    except Exception as e:
-        print(f"Error: {e}")
+        except KeyboardInterrupt:
+            print("Exiting sniffing...")
+        except Exception as e:
+            print(f"Error: {e}")
 
 
 if __name__ == "__main__":
@@ -1,6 +1,12 @@
+import os
+import sys
 import serial
 import time
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from protocol import SOI_SNS, encode_command  # noqa: E402
+
 # Configuration
 PORT = "/dev/ttyUSB1"
 BAUD = 9600
@@ -14,38 +20,7 @@ def create_command(addr, cid1, cid2, payload=""):
     """
     Constructs a command with optional payload.
     """
-    command = ">"  # Start of command ('3E' in ASCII)
-    command += "22"  # Version
-    command += addr  # Address
-    command += cid1  # CID1
-    command += cid2  # CID2
-
-    if payload:
-        length = len(payload) // 2  # Calculate length in bytes
-        length = length & 0x0FFF
-        n1, n2, n3 = length & 0xF, (length >> 4) & 0xF, (length >> 8) & 0xF
-        checksum_prefix = ((n1 + n2 + n3) & 0xF) ^ 0xF
-        length_field = f"{length + (checksum_prefix << 12):04X}"
-        command += length_field
-        command += payload
-    else:
-        command += "0000"
-
-    checksum = calculate_checksum(command[1:])
-    command += f"{checksum:04X}"
-    command += "\r"  # Add terminator
-    return command
-
-
-def calculate_checksum(message):
-    """
-    Calculates checksum for the given command string.
-    """
-    checksum = 0
-    for char in message:
-        checksum += ord(char)
-    checksum ^= 0xFFFF
-    return checksum + 1
+    return encode_command(SOI_SNS, int(addr, 16), int(cid1, 16), int(cid2, 16), payload).decode()
 
 def send_command(ser, command):
     """
@@ -0,0 +1,106 @@
+"""
+Round trip latency of the native TCP transport compared with the old socat pty path.
+
+A local TCP server stands in for the RS485-Ethernet gateway: it answers every CR terminated request
+with the recorded Service 42 response from parse.py. The same request/response exchange is then timed
+through TcpSerial directly and, if the socat binary is installed, through a socat pty as the
+container did before.
+
+Usage: python debugging/tcp_latency.py [rounds]
+"""
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import serial  # noqa: E402
+
+from parse import ho  # noqa: E402
+from tcp_transport import TcpSerial  # noqa: E402
+from utils import FrameReader  # noqa: E402
+
+ROUNDS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+REQUEST = b">220842420000FDA8\r"
+RESPONSE = ho.encode()
+
+
+def serve_gateway(server):
+    """Answer every request frame on every accepted connection with the recorded response."""
+    while True:
+        try:
+            conn, _ = server.accept()
+        except OSError:
+            return
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        threading.Thread(target=answer_requests, args=(conn,), daemon=True).start()
+
+
+def answer_requests(conn):
+    buffer = b""
+    with conn:
+        while True:
+            data = conn.recv(4096)
+            if not data:
+                return
+            buffer += data
+            while b"\r" in buffer:
+                _, buffer = buffer.split(b"\r", 1)
+                conn.sendall(RESPONSE)
+
+
+def measure(ser, rounds):
+    reader = FrameReader(ser)
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        ser.write(REQUEST)
+        ser.flush()
+        frame = reader.read_frame(2.0)
+        if frame != RESPONSE:
+            raise RuntimeError(f"unexpected response: {frame}")
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{name:<8} mean {statistics.mean(samples):7.3f} ms   p50 {statistics.median(samples):7.3f} ms   p95 {p95:7.3f} ms   max {samples[-1]:7.3f} ms")
+
+
+def main():
+    server = socket.create_server(("127.0.0.1", 0))
+    host, port = server.getsockname()
+    threading.Thread(target=serve_gateway, args=(server,), daemon=True).start()
+    print(f"Gateway stand-in on {host}:{port}, {ROUNDS} round trips of {len(REQUEST)} + {len(RESPONSE)} bytes\n")
+
+    with TcpSerial(f"socket://{host}:{port}") as ser:
+        report("native", measure(ser, ROUNDS))
+
+    if not shutil.which("socat"):
+        print("socat   not installed, skipping the pty comparison")
+        return
+
+    link = os.path.join(tempfile.mkdtemp(), "ttySOCAT")
+    socat = subprocess.Popen(["socat", f"pty,link={link},raw,echo=0", f"tcp:{host}:{port}"], stderr=subprocess.DEVNULL)
+    try:
+        for _ in range(50):
+            if os.path.exists(link):
+                break
+            time.sleep(0.1)
+        with serial.Serial(link, 9600, timeout=0.1) as ser:
+            report("socat", measure(ser, ROUNDS))
+    finally:
+        socat.terminate()
+        socat.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+import os
+import queue
+import signal
+import threading
+from typing import Callable, Union
+
+from metrics import metrics
+from utils import logger
+
+
+DIAGNOSTIC_MODES = ("off", "every", "change", "signal")
+"""
+off: never decode, every: every Nth frame, change: frames that differ from the last one, signal: only on demand.
+A decode can be requested with SIGUSR1 in every mode.
+"""
+
+
+class PayloadDiagnostics:
+    """
+    Sampled, asynchronous decoding of reply frames for troubleshooting.
+
+    The reply path only hands frames over with `offer`, which never blocks. Decoding and printing happen on a
+    background thread running at the lowest CPU priority, frames are dropped if that thread falls behind.
+    """
+
+    def __init__(
+        self,
+        decoder: Callable[[str], None],
+        mode: str = "off",
+        every: int = 100,
+        signum: Union[int, None] = getattr(signal, "SIGUSR1", None),
+        queue_size: int = 8,
+    ):
+        """
+        :param decoder: Function decoding and printing a frame given as ASCII string
+        :param mode: One of DIAGNOSTIC_MODES
+        :param every: Decode every Nth frame in mode "every"
+        :param signum: Signal requesting a decode of the next frame, None disables it
+        :param queue_size: Number of frames waiting for the decoder before new ones are dropped
+        """
+        if mode not in DIAGNOSTIC_MODES:
+            raise ValueError(f"unknown diagnostics mode {mode!r}, expected one of {', '.join(DIAGNOSTIC_MODES)}")
+        self.decoder = decoder
+        self.mode = mode
+        self.every = max(1, every)
+        self.signum = signum
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._count = 0
+        self._last_frame = None
+        self._requested = False
+        self._thread = None
+
+    def start(self) -> None:
+        """
+        Start the decoder thread and install the signal handler.
+        Signal handlers can only be installed from the main thread, elsewhere the signal is not available.
+        """
+        if self.signum is not None and threading.current_thread() is threading.main_thread():
+            signal.signal(self.signum, lambda signum, frame: self.request())
+        self._thread = threading.Thread(target=self._run, name="PayloadDiagnostics", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the decoder thread.
+        """
+        if self._thread:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                pass
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def request(self) -> None:
+        """
+        Decode the next offered frame regardless of the mode.
+        """
+        self._requested = True
+
+    def offer(self, frame: bytes) -> None:
+        """
+        Hand a frame over for decoding if it is sampled. Never blocks.
+
+        :param frame: Complete reply frame
+        """
+        if self._requested:
+            self._requested = False
+        elif self.mode == "every":
+            self._count += 1
+            if self._count < self.every:
+                return
+            self._count = 0
+        elif self.mode == "change":
+            if frame == self._last_frame:
+                return
+            self._last_frame = frame
+        else:
+            return
+
+        try:
+            self._queue.put_nowait(frame)
+        except queue.Full:
+            metrics.inc("diagnostics_dropped_total")
+
+    def _run(self) -> None:
+        try:
+            # Linux applies nice values per thread, keep the decoder behind the reply path
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError) as e:
+            logger.debug(f"Could not lower the priority of the diagnostics thread: {e}")
+
+        while True:
+            frame = self._queue.get()
+            if frame is None:
+                return
+            try:
+                self.decoder(frame.decode("ascii"))
+            except Exception as e:
+                logger.warning(f"Diagnostic decode failed: {e}")
@@ -65,11 +65,23 @@ cleanup() {
 # Trap exit signals
 trap cleanup SIGTERM SIGINT
 
-# Start socat in background
-start_socat &
+# Function to check if a port is a socket://host:port or tcp://host:port URL of an RS485-Ethernet gateway
+is_tcp_url() {
+    case "$1" in
+        socket://*|tcp://*) return 0 ;;
+        *) return 1 ;;
+    esac
+}
+
+# By default the bridge uses the socat ptys /dev/ttyUSB0 and /dev/ttyUSB1. Set both DAREN_PORT and SNS_PORT to
+# socket://host:port URLs to connect to the gateways directly over TCP, socat is then not started.
+if ! is_tcp_url "${DAREN_PORT:-}" || ! is_tcp_url "${SNS_PORT:-}"; then
+    # Start socat in background
+    start_socat &
 
-# Wait for virtual devices before launching Python
-wait_for_serial_devices
+    # Wait for virtual devices before launching Python
+    wait_for_serial_devices
+fi
 
 # Start Python process in background
 start_python
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import threading
+from time import monotonic
+from typing import Dict, Tuple, Union
+
+
+class FrameCache:
+    """
+    Thread-safe store of the latest Daren reply frame per SNS address.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._frames: Dict[bytes, Tuple[bytes, float]] = {}
+
+    def put(self, address: bytes, frame: bytes) -> None:
+        """
+        Store the latest frame of an address.
+
+        :param address: SNS address
+        :param frame: Complete Daren reply frame
+        """
+        with self._lock:
+            self._frames[address] = (frame, monotonic())
+
+    def get(self, address: bytes, max_age: Union[float, None] = None) -> Union[bytes, None]:
+        """
+        Get the latest frame of an address.
+
+        :param address: SNS address
+        :param max_age: Maximum age in seconds, `None` accepts any age
+        :return: Frame or None if there is no frame or it is older than max_age
+        """
+        with self._lock:
+            entry = self._frames.get(address)
+        if entry is None:
+            return None
+        frame, updated_at = entry
+        if max_age is not None and monotonic() - updated_at > max_age:
+            return None
+        return frame
+
+    def age(self, address: bytes) -> Union[float, None]:
+        """
+        Get the age of the latest frame of an address.
+
+        :param address: SNS address
+        :return: Age in seconds or None if there is no frame
+        """
+        with self._lock:
+            entry = self._frames.get(address)
+        return None if entry is None else monotonic() - entry[1]
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+import bisect
+import threading
+from time import monotonic
+from typing import Dict, List, Tuple, Union
+
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.15, 0.2, 0.25, 0.3, 0.4, 0.5, 0.75, 1.0, 2.0, 5.0)
+"""
+Upper bounds in seconds of the latency histogram buckets, values above the last bound go to an overflow bucket
+"""
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. Percentiles are interpolated within the bucket they fall into.
+    Not thread-safe on its own, Metrics guards it with its lock.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        """
+        :param buckets: Sorted upper bounds of the buckets
+        """
+        self.buckets = buckets
+        self.counts: List[int] = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        """
+        Add a value.
+
+        :param value: Value to add
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> Union[float, None]:
+        """
+        Estimate a percentile.
+
+        :param q: Percentile between 0 and 100
+        :return: Estimated value or None if the histogram is empty
+        """
+        if not self.count:
+            return None
+        rank = self.count * q / 100
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / bucket_count, self.max)
+            seen += bucket_count
+        return self.max
+
+    def describe(self) -> str:
+        """
+        Format count, p50/p95/p99 and max of a latency histogram in milliseconds.
+
+        :return: Formatted values
+        """
+        if not self.count:
+            return "n=0"
+        return (
+            f"n={self.count} p50={self.percentile(50) * 1000:.1f}ms p95={self.percentile(95) * 1000:.1f}ms "
+            f"p99={self.percentile(99) * 1000:.1f}ms max={self.max * 1000:.1f}ms"
+        )
+
+    def copy(self) -> "Histogram":
+        histogram = Histogram(self.buckets)
+        histogram.counts = list(self.counts)
+        histogram.count, histogram.sum, histogram.max = self.count, self.sum, self.max
+        return histogram
+
+
+class Metrics:
+    """
+    Thread-safe registry for counters and gauges of the bridge.
+
+    Every value is identified by its name and an optional set of labels, e.g.
+    `metrics.inc("sns_port_opens_total", bus="/dev/ttyUSB1")`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, tuple], float] = {}
+        self._gauges: Dict[Tuple[str, tuple], float] = {}
+        self._histograms: Dict[Tuple[str, tuple], Histogram] = {}
+        self._label_strings: Dict[tuple, str] = {}  # rendered Prometheus labels, reused between scrapes
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> Tuple[str, tuple]:
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """
+        Increase a counter.
+
+        :param name: Name of the counter
+        :param value: Amount to add
+        :param labels: Labels of the counter
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        """
+        Set a gauge to a value.
+
+        :param name: Name of the gauge
+        :param value: New value
+        :param labels: Labels of the gauge
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """
+        Add a value to a histogram.
+
+        :param name: Name of the histogram
+        :param value: Value to add, in seconds for latencies
+        :param labels: Labels of the histogram
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def histogram(self, name: str, **labels) -> Union[Histogram, None]:
+        """
+        Get a copy of a histogram.
+
+        :param name: Name of the histogram
+        :param labels: Labels of the histogram
+        :return: Copy of the histogram or None if nothing was observed yet
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            return None if histogram is None else histogram.copy()
+
+    def get(self, name: str, **labels) -> Union[float, None]:
+        """
+        Get the current value of a counter or gauge.
+
+        :param name: Name of the counter or gauge
+        :param labels: Labels of the counter or gauge
+        :return: Current value or None if it was never set
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            if key in self._counters:
+                return self._counters[key]
+            return self._gauges.get(key)
+
+    def snapshot(self) -> Dict[str, Dict[Tuple[str, tuple], float]]:
+        """
+        Get a consistent copy of all values.
+
+        :return: Dict with the keys `counters`, `gauges` and `histograms`
+        """
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "histograms": {key: histogram.copy() for key, histogram in self._histograms.items()},
+            }
+
+    def summary(self) -> str:
+        """
+        Format all values as a single line for the log.
+
+        :return: Formatted values
+        """
+        snapshot = self.snapshot()
+        values = []
+        for (name, labels), value in sorted({**snapshot["counters"], **snapshot["gauges"]}.items()):
+            label_str = ",".join(f"{k}={v}" for k, v in labels)
+            values.append(f"{name}{{{label_str}}}={value:g}" if label_str else f"{name}={value:g}")
+        return " ".join(values)
+
+    def _render_labels(self, labels: tuple) -> str:
+        label_str = self._label_strings.get(labels)
+        if label_str is None:
+            escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+            label_str = ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped))
+            self._label_strings[labels] = label_str
+        return label_str
+
+    def render_prometheus(self, prefix: str = "") -> str:
+        """
+        Render all values in the Prometheus text exposition format.
+
+        :param prefix: Prefix added to every metric name
+        :return: Metrics page
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for kind, values in (("counter", snapshot["counters"]), ("gauge", snapshot["gauges"])):
+            last_name = None
+            for (name, labels), value in sorted(values.items()):
+                if name != last_name:
+                    lines.append(f"# TYPE {prefix}{name} {kind}")
+                    last_name = name
+                label_str = self._render_labels(labels)
+                lines.append(f"{prefix}{name}{{{label_str}}} {value:g}" if label_str else f"{prefix}{name} {value:g}")
+
+        last_name = None
+        for (name, labels), histogram in sorted(snapshot["histograms"].items()):
+            if name != last_name:
+                lines.append(f"# TYPE {prefix}{name} histogram")
+                last_name = name
+            label_str = self._render_labels(labels)
+            separator = "," if label_str else ""
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{prefix}{name}_bucket{{{label_str}{separator}le="{bound:g}"}} {cumulative}')
+            lines.append(f'{prefix}{name}_bucket{{{label_str}{separator}le="+Inf"}} {histogram.count}')
+            lines.append(f"{prefix}{name}_sum{{{label_str}}} {histogram.sum:g}")
+            lines.append(f"{prefix}{name}_count{{{label_str}}} {histogram.count}")
+        lines.append("")
+        return "\n".join(lines)
+
+
+class RequestTrace:
+    """
+    Timestamps of one master request at each stage of its way through the bridge.
+    All stages are recorded relative to the moment the request frame was complete.
+    """
+
+    STAGES = (
+        "frame_complete",
+        "queued",
+        "started",
+        "sns_write",
+        "sns_first_byte",
+        "sns_frame_complete",
+        "transform_done",
+        "reply_written",
+    )
+
+    def __init__(self, frame_complete_at: Union[float, None] = None):
+        """
+        :param frame_complete_at: monotonic() timestamp of the complete request frame, defaults to now
+        """
+        self.frame_complete_at = monotonic() if frame_complete_at is None else frame_complete_at
+        self.marks: Dict[str, float] = {}
+
+    def mark(self, stage: str, at: Union[float, None] = None) -> None:
+        """
+        Record the time a stage was reached, a repeated stage (e.g. an SNS retry) overwrites the earlier one.
+
+        :param stage: One of STAGES
+        :param at: monotonic() timestamp, defaults to now
+        """
+        self.marks[stage] = monotonic() if at is None else at
+
+    def record(self, metrics: "Metrics", address: str) -> None:
+        """
+        Add the elapsed time of every reached stage to the `request_latency_seconds` histograms.
+
+        :param metrics: Registry to record into
+        :param address: SNS address label
+        """
+        # the SnsBus worker may still add marks of an abandoned transaction, iterate over a copy
+        for stage, at in list(self.marks.items()):
+            metrics.observe("request_latency_seconds", at - self.frame_complete_at, address=address, stage=stage)
+
+
+metrics = Metrics()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Callable, Iterable
+
+from metrics import Metrics, metrics as default_metrics
+from utils import logger
+
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricsServer:
+    """
+    Minimal HTTP server exposing a metrics registry at `/metrics` in the Prometheus text format.
+
+    Scrapes are answered one after the other by a single daemon thread, so they never run on
+    (or compete with) the serial threads of the bridge.
+    """
+
+    def __init__(
+        self,
+        port: int,
+        host: str = "0.0.0.0",
+        registry: Metrics = default_metrics,
+        collectors: Iterable[Callable[[], None]] = (),
+        prefix: str = "daren_sns_bridge_",
+    ):
+        """
+        :param port: TCP port to listen on
+        :param host: Address to listen on
+        :param registry: Metrics to serve
+        :param collectors: Functions updating gauges that are only computed on a scrape
+        :param prefix: Prefix added to every metric name
+        """
+        self.port = port
+        self.host = host
+        self.registry = registry
+        self.collectors = list(collectors)
+        self.prefix = prefix
+        self._server = None
+        self._thread = None
+
+    def start(self) -> None:
+        """
+        Start listening on a daemon thread.
+        """
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = server.render()
+                self.send_response(200)
+                self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug("Metrics scrape from %s: %s", self.address_string(), format % args)
+
+        self._server = HTTPServer((self.host, self.port), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, name="MetricsServer", daemon=True)
+        self._thread.start()
+        logger.info(f"Serving metrics on http://{self.host}:{self._server.server_port}/metrics")
+
+    def stop(self) -> None:
+        """
+        Stop the server.
+        """
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def render(self) -> bytes:
+        """
+        Run the collectors and render the metrics page.
+
+        :return: Encoded metrics page
+        """
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.warning(f"Metrics collector {collector} failed: {e}")
+        return self.registry.render_prometheus(self.prefix).encode()
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Table-driven decoder of the status words of the Service 42 (realtime data) response into Protection fields.
+
+The bit map is declared once in PROTECTION_BITS and compiled at import into one lookup table per status word.
+A table maps the status word, masked to the bits used by its fields, to the Protection values of all its fields,
+so decoding a response is one AND and one dict lookup per status word. apply_protection additionally keeps the
+merged values of recent combinations, a repeated combination is one lookup and one assignment of all fields.
+"""
+from typing import Dict, Tuple
+
+
+STATUS_WORDS = ("voltage", "current", "temperature", "warning")
+"""
+Status words of the Service 42 response, in the order they are passed to the decoder
+"""
+
+PROTECTION_BITS: Dict[str, Tuple[str, Tuple[int, ...], Tuple[int, ...]]] = {
+    # Protection field: (status word, bits raising an alarm (2), bits raising a warning (1))
+    # bit 2 TOT_OVV_PROT, bit 0 cell_OVV_PROT / bit 6 TOT_OVV_alarm, bit 4 cell_OVV_alarm
+    # NOTE: high_voltage_cell not implemented, now incorporated in high_voltage. Split if ever implemented.
+    "high_voltage": ("voltage", (2, 0), (6, 4)),
+    # bit 3 TOT_UNDV_PROT / bit 7 TOT_UNDV_alarm
+    "low_voltage": ("voltage", (3,), (7,)),
+    # bit 1 cell_UNDV_PROT / bit 5 cell_UNDV_alarm
+    "low_cell_voltage": ("voltage", (1,), (5,)),
+    # bit 14 V_DIF_PROT / bit 8 V_DIF_ALARM
+    "cell_imbalance": ("voltage", (14,), (8,)),
+    # bit 13 blown_fuse
+    "fuse_blown": ("voltage", (13,), ()),
+    # bit 2 CHG_OC_PROT / bit 6 CHG_C_alarm
+    "high_charge_current": ("current", (2,), (6,)),
+    # bit 4 DISCH_OC_1_PROT, bit 5 DISCH_OC_2_PROT, bit 3 Short_circuit_PROT / bit 7 DISCH_C_alarm
+    "high_discharge_current": ("current", (4, 5, 3), (7,)),
+    # bit 0 CHG_H_TEMP_PROT / bit 8 CHG_H_TEMP_alarm
+    "high_charge_temperature": ("temperature", (0,), (8,)),
+    # bit 1 CHG_L_TEMP_PROT / bit 9 CHG_L_TEMP_alarm
+    "low_charge_temperature": ("temperature", (1,), (9,)),
+    # bit 0 CHG_H_TEMP_PROT, bit 2 DISCH_H_TEMP_PROT / bit 8 CHG_H_TEMP_alarm, bit 10 DISCH_H_TEMP_alarm
+    "high_temperature": ("temperature", (0, 2), (8, 10)),
+    # bit 1 CHG_L_TEMP_PROT, bit 3 DISCH_L_TEMP_PROT / bit 9 CHG_L_TEMP_alarm, bit 11 DISCH_L_TEMP_alarm
+    "low_temperature": ("temperature", (1, 3), (9, 11)),
+    # bit 6 MOS_H_TEMP_PROT, bit 4 ENV_H_TEMP_PROT / bit 14 MOS_H_TEMP_alarm, bit 12 ENV_H_TEMP_alarm
+    "high_internal_temperature": ("temperature", (6, 4), (14, 12)),
+    # bit 7 low_BAT_alarm
+    "low_soc": ("warning", (7,), ()),
+    # any other internal component in warning (CHG_FET, NTC_fail, cell_fail, chg_mos_fail, disch_mos_fail, ...),
+    # bit 0 V_DIF_alarm and bit 7 low_BAT_alarm are already reported by cell_imbalance and low_soc
+    "internal_failure": ("warning", (1, 2, 3, 4, 5, 6), ()),
+}
+
+
+def compile_protection_tables(protection_bits: Dict[str, Tuple[str, Tuple[int, ...], Tuple[int, ...]]]) -> Tuple[Tuple[int, Dict[int, Dict[str, int]]], ...]:
+    """
+    Compile the bit map into one (mask, table) pair per status word, in the order of STATUS_WORDS.
+    The table holds the Protection values of the fields of the word for every combination of the masked bits,
+    combinations with the same values share one dict.
+
+    :param protection_bits: Bit map in the form of PROTECTION_BITS
+    :return: Tuple of (mask, table) per status word
+    """
+    tables = []
+    for word in STATUS_WORDS:
+        fields = [(field, alarm, warning) for field, (field_word, alarm, warning) in protection_bits.items() if field_word == word]
+        bits = sorted({bit for _, alarm, warning in fields for bit in alarm + warning})
+        mask = sum(1 << bit for bit in bits)
+
+        shared: Dict[Tuple[int, ...], Dict[str, int]] = {}
+        table: Dict[int, Dict[str, int]] = {}
+        for combination in range(1 << len(bits)):
+            value = sum(1 << bit for i, bit in enumerate(bits) if combination & (1 << i))
+            states = tuple(
+                2 if any(value & (1 << bit) for bit in alarm) else 1 if any(value & (1 << bit) for bit in warning) else 0
+                for _, alarm, warning in fields
+            )
+            table[value] = shared.setdefault(states, {field: state for (field, _, _), state in zip(fields, states)})
+        tables.append((mask, table))
+    return tuple(tables)
+
+
+PROTECTION_TABLES = compile_protection_tables(PROTECTION_BITS)
+(VOLTAGE_MASK, VOLTAGE_TABLE), (CURRENT_MASK, CURRENT_TABLE), (TEMPERATURE_MASK, TEMPERATURE_TABLE), (WARNING_MASK, WARNING_TABLE) = PROTECTION_TABLES
+
+
+def decode_protection(voltage_status: int, current_status: int, temperature_status: int, warning_status: int) -> Dict[str, int]:
+    """
+    Decode the status words of a Service 42 response into Protection values.
+
+    :return: Dict of Protection field -> 2 (alarm), 1 (warning) or 0 (ok)
+    """
+    return {
+        **VOLTAGE_TABLE[voltage_status & VOLTAGE_MASK],
+        **CURRENT_TABLE[current_status & CURRENT_MASK],
+        **TEMPERATURE_TABLE[temperature_status & TEMPERATURE_MASK],
+        **WARNING_TABLE[warning_status & WARNING_MASK],
+    }
+
+
+PROTECTION_FIELDS = tuple(PROTECTION_BITS)
+"""
+Protection fields set by the decoder, in the order of the values apply_protection writes
+"""
+
+COMBINED_CACHE_SIZE = 4096
+"""
+Number of decoded status word combinations apply_protection keeps, a pack only ever reports a handful
+"""
+_combined: Dict[int, Tuple[int, ...]] = {}
+
+
+def apply_protection(protection, voltage_status: int, current_status: int, temperature_status: int, warning_status: int) -> None:
+    """
+    Decode the status words of a Service 42 response and write the values to a Protection object in bulk.
+    The values of all four words are merged once per combination of the masked words, so a repeated
+    combination costs one lookup and one assignment of all fields.
+
+    :param protection: Protection of the battery
+    """
+    key = (
+        (voltage_status & VOLTAGE_MASK)
+        | (current_status & CURRENT_MASK) << 16
+        | (temperature_status & TEMPERATURE_MASK) << 32
+        | (warning_status & WARNING_MASK) << 48
+    )
+    values = _combined.get(key)
+    if values is None:
+        if len(_combined) >= COMBINED_CACHE_SIZE:
+            _combined.clear()
+        decoded = decode_protection(voltage_status, current_status, temperature_status, warning_status)
+        values = _combined[key] = tuple(decoded[field] for field in PROTECTION_FIELDS)
+    # same order as PROTECTION_FIELDS, checked below
+    (
+        protection.high_voltage,
+        protection.low_voltage,
+        protection.low_cell_voltage,
+        protection.cell_imbalance,
+        protection.fuse_blown,
+        protection.high_charge_current,
+        protection.high_discharge_current,
+        protection.high_charge_temperature,
+        protection.low_charge_temperature,
+        protection.high_temperature,
+        protection.low_temperature,
+        protection.high_internal_temperature,
+        protection.low_soc,
+        protection.internal_failure,
+    ) = values
+
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Codec for YD/T1363 style frames as used by the Daren (DR-JC03) and SNS (Ho01/Ho02) BMS.
+
+A frame is sent as ASCII hex, except for SOI and EOI:
+
+    SOI  VER  ADR  CID1  CID2  LENID  INFO  CHKSUM  EOI
+    `~`  22   08   4A    42    E002   08    FD26    \\r
+
+SOI is `~` for Daren and `>` for SNS modules. LENID holds the number of INFO characters in its lower
+12 bits and a 4 bit checksum of that length in its upper 4 bits. CHKSUM is the two's complement of the
+sum of all characters between SOI and CHKSUM.
+"""
+from typing import NamedTuple, Union
+
+
+SOI_DAREN = b"~"
+SOI_SNS = b">"
+EOI = b"\r"
+
+HEADER_LENGTH = 13
+"""
+SOI + VER + ADR + CID1 + CID2 + LENID, the INFO field starts at this offset
+"""
+
+TRAILER_LENGTH = 5
+"""
+CHKSUM + EOI
+"""
+
+
+class FrameError(ValueError):
+    """
+    Raised when a frame cannot be decoded.
+    """
+
+
+class Frame(NamedTuple):
+    """
+    A decoded frame. `cid2` holds the command of a request or the return code (RTN) of a response,
+    `info` the INFO field as ASCII hex characters.
+    """
+
+    soi: bytes
+    ver: int
+    adr: int
+    cid1: int
+    cid2: int
+    info: bytes = b""
+
+
+def _lchksum(length: int) -> int:
+    return ((-((length & 0xF) + ((length >> 4) & 0xF) + ((length >> 8) & 0xF))) & 0xF) << 12
+
+
+LENID_TABLE = tuple(length | _lchksum(length) for length in range(0x1000))
+"""
+LENID (length + length checksum) for every possible 12 bit INFO length
+"""
+
+
+def length_checksum(length: int) -> int:
+    """
+    Calculate the LENID field: the 12 bit INFO length plus its 4 bit checksum.
+
+    :param length: Number of INFO characters
+    :return: LENID value
+    """
+    return LENID_TABLE[length & 0x0FFF]
+
+
+def calculate_checksum(data: Union[bytes, bytearray, memoryview, str]) -> int:
+    """
+    Calculate CHKSUM over the characters between SOI and CHKSUM.
+
+    :param data: Frame content without SOI, CHKSUM and EOI
+    :return: Checksum value
+    """
+    if isinstance(data, str):
+        data = data.encode("ascii")
+    return (-sum(data)) & 0xFFFF
+
+
+def encode_frame(frame: Frame) -> bytes:
+    """
+    Encode a frame including LENID, CHKSUM and EOI.
+
+    :param frame: Frame to encode
+    :return: Encoded frame
+    """
+    return encode_command(frame.soi, frame.adr, frame.cid1, frame.cid2, frame.info, frame.ver)
+
+
+def encode_command(soi: bytes, adr: int, cid1: int, cid2: int, info: Union[bytes, str] = b"", ver: int = 0x22) -> bytes:
+    """
+    Encode a command frame.
+
+    :param soi: SOI_DAREN or SOI_SNS
+    :param adr: Address of the module
+    :param cid1: Device identification code
+    :param cid2: Command
+    :param info: INFO field as ASCII hex characters
+    :param ver: Protocol version
+    :return: Encoded frame
+    """
+    if isinstance(info, str):
+        info = info.encode("ascii")
+    # formatted in one pass without building a Frame, commands are encoded on every poll
+    body = b"%02X%02X%02X%02X%04X%s" % (ver, adr, cid1, cid2, LENID_TABLE[len(info) & 0x0FFF], info)
+    return b"%s%s%04X%s" % (soi, body, (-sum(body)) & 0xFFFF, EOI)
+
+
+def validate_frame(data: Union[bytes, bytearray, str]) -> bool:
+    """
+    Check SOI, EOI, LENID and CHKSUM of a raw frame.
+
+    :param data: Raw frame including EOI
+    :return: True if the frame is valid
+    """
+    try:
+        decode_frame(data)
+    except FrameError:
+        return False
+    return True
+
+
+def decode_frame(data: Union[bytes, bytearray, str]) -> Frame:
+    """
+    Decode and validate a raw frame.
+
+    :param data: Raw frame including EOI
+    :return: Decoded frame
+    """
+    if isinstance(data, str):
+        data = data.encode("ascii", errors="replace")
+    if len(data) < HEADER_LENGTH + TRAILER_LENGTH:
+        raise FrameError(f"frame too short ({len(data)} bytes)")
+    soi = data[0:1]
+    if soi != SOI_DAREN and soi != SOI_SNS:
+        raise FrameError(f"invalid SOI {soi!r}")
+    if data[-1:] != EOI:
+        raise FrameError("missing EOI")
+
+    try:
+        header = bytes.fromhex(data[1:HEADER_LENGTH].decode("ascii"))
+        received_checksum = int(data[-TRAILER_LENGTH:-1], 16)
+    except ValueError as e:
+        raise FrameError(f"invalid hex in header or checksum: {e}")
+
+    ver, adr, cid1, cid2 = header[0], header[1], header[2], header[3]
+    lenid = (header[4] << 8) | header[5]
+    length = lenid & 0x0FFF
+    if LENID_TABLE[length] != lenid:
+        raise FrameError(f"LENID checksum error ({lenid:04X})")
+    if len(data) - HEADER_LENGTH - TRAILER_LENGTH != length:
+        raise FrameError(f"INFO length {len(data) - HEADER_LENGTH - TRAILER_LENGTH} does not match LENID length {length}")
+
+    calculated_checksum = (-sum(memoryview(data)[1:-TRAILER_LENGTH])) & 0xFFFF
+    if calculated_checksum != received_checksum:
+        raise FrameError(f"checksum error, calculated {calculated_checksum:04X}, received {received_checksum:04X}")
+
+    return Frame(soi, ver, adr, cid1, cid2, bytes(data[HEADER_LENGTH:-TRAILER_LENGTH]))
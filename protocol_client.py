@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+from contextlib import contextmanager
+from time import monotonic
+from typing import Iterator, Union
+
+import serial
+
+from protocol import SOI_DAREN, SOI_SNS, FrameError, decode_frame, encode_command
+from metrics import RequestTrace
+from utils import open_serial_port, logger, traffic_logger, FrameReader
+
+
+RETURN_CODES = {
+    "01": "VER error.",
+    "02": "CHKSUM error.",
+    "03": "LCHKSUM error.",
+    "04": "CID2 invalid.",
+    "05": "Command format error.",
+    "06": "INFO data invalid.",
+    "90": "ADR error.",
+    "91": "Battery communication error.",
+}
+"""
+Return codes (RTN, in the CID2 field of a response) other than 00 (ok)
+"""
+
+
+class ProtocolClient:
+    """
+    Transport and command/response exchange with YD/T1363 modules on one port, without any battery state.
+
+    The client holds the port, its FrameReader and the SOI of the protocol variant. Commands carry the
+    address, so one client serves every module on its bus and can be shared by everything talking to it.
+    The port is either kept open (open/close, as on the bridge's SNS buses) or opened for a block of
+    commands (connection, as in the drivers).
+    """
+
+    SOI: bytes = b""
+
+    def __init__(self, port: str, baud: int):
+        """
+        :param port: Serial port or RS485-Ethernet gateway URL
+        :param baud: Baud rate
+        """
+        self.port = port
+        self.baud = baud
+        self.ser = None
+        self.frame_reader: Union[FrameReader, None] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.ser is not None and self.ser.is_open
+
+    def open(self) -> bool:
+        """
+        Open the port unless it is open already.
+
+        :return: True if the port is open
+        """
+        if self.is_open:
+            return True
+        self.ser = open_serial_port(self.port, self.baud)
+        if not self.is_open:
+            self.ser = None
+            return False
+        self.frame_reader = FrameReader(self.ser)
+        return True
+
+    def close(self) -> None:
+        """
+        Close the port, errors while closing are ignored.
+        """
+        if self.ser is not None:
+            try:
+                self.ser.close()
+            except (serial.SerialException, OSError) as e:
+                logger.debug(f"Error while closing {self.port}: {e}")
+        self.ser = None
+        self.frame_reader = None
+
+    @contextmanager
+    def connection(self) -> Iterator[Union[serial.Serial, None]]:
+        """
+        Open the port for a block of commands and close it afterwards.
+
+        :return: Context manager yielding the opened port or None if it could not be opened
+        """
+        try:
+            yield self.ser if self.open() else None
+        finally:
+            self.close()
+
+    def create_command(self, adr: int, cid1: int, cid2: int, info: Union[bytes, str] = b"") -> bytes:
+        """
+        Encode a command frame with the SOI of the client.
+
+        :param adr: Address of the module
+        :param cid1: Device identification code
+        :param cid2: Command
+        :param info: INFO field as ASCII hex characters
+        :return: Encoded frame
+        """
+        return encode_command(self.SOI, adr, cid1, cid2, info)
+
+    def transact(self, command: bytes, timeout: float, trace: Union[RequestTrace, None] = None) -> Union[bytes, None]:
+        """
+        Send a command on the open port and read the next complete frame, without validating it.
+        Port errors are raised, the caller decides whether to reconnect.
+
+        :param command: Complete command frame
+        :param timeout: Deadline in seconds for the response
+        :param trace: Trace of a master request, receives the sns_write, sns_first_byte and sns_frame_complete stages
+        :return: Raw response frame or None if there was no complete frame in time
+        """
+        self.ser.reset_input_buffer()
+        self.frame_reader.reset()
+        self.ser.write(command)
+        self.ser.flush()
+        traffic_logger.info("Sent to %s: %s", self.port, command)
+        if trace is None:
+            return self.frame_reader.read_frame(timeout)
+        trace.mark("sns_write")
+        response = self.frame_reader.read_frame(timeout)
+        if response is not None:
+            trace.mark("sns_first_byte", self.frame_reader.frame_first_byte_at)
+            trace.mark("sns_frame_complete")
+        return response
+
+    def exchange(self, ser, command: str, timeout: float, name: str = "command") -> Union[str, bool]:
+        """
+        Send a command and wait for a complete, checksum-valid response with return code 00.
+
+        :param ser: Port the command is sent on, usually the one yielded by connection
+        :param command: Complete command frame
+        :param timeout: Deadline in seconds for the response
+        :param name: Name of the command in the traffic log
+        :return: Response frame or False
+        """
+        ser.flushOutput()
+        ser.flushInput()
+        ser.write(command.encode())
+        traffic_logger.info("%s request sent: %s", name, command)
+        return self.read_response(ser, timeout)
+
+    def read_response(self, ser, timeout: float = 1.5) -> Union[str, bool]:
+        """
+        After sending the command to the device, this service waits for a complete, checksum-valid response frame
+        and performs basic parsing and validation of received data.
+        It returns as soon as the frame is in, or False once the timeout (the deadline of the command) has passed.
+        Noise and corrupt frames are skipped while the deadline allows it.
+        """
+        if self.frame_reader is None or self.frame_reader.ser is not ser:
+            self.frame_reader = FrameReader(ser)
+        # the input was flushed before the command was sent, bytes still buffered belong to an earlier response
+        self.frame_reader.reset()
+        deadline = monotonic() + timeout
+
+        while True:
+            try:
+                frame = self.frame_reader.read_frame(max(0.0, deadline - monotonic()))
+            except Exception as e:
+                logger.error("Exception while reading the response: {}".format(e))
+                return False
+            if frame is None:
+                logger.debug("No complete response within %s s.", timeout)
+                return False
+
+            buff = frame[max(0, frame.rfind(self.SOI)) :].decode("ascii", errors="replace")
+            try:
+                decode_frame(buff)
+                logger.debug("Data length and checksum ok.")
+                break
+            except FrameError as e:
+                logger.error("read_response frame invalid: {}".format(e))
+                logger.error("Received data: {}".format(buff))
+
+        traffic_logger.info("Received data: %s", buff)
+
+        CID2 = buff[7:9]
+        if self.CID2_decode(CID2) == -1:
+            logger.debug("CID2_Decode error!")
+            logger.debug("Buffer contents: %s", buff)
+            return False
+
+        logger.debug("read_response Data valid!")
+        return buff
+
+    @staticmethod
+    def CID2_decode(CID2: str) -> int:
+        if CID2 == "00":
+            logger.debug("CID2 response ok.")
+            return 0
+        if CID2 in RETURN_CODES:
+            logger.error(RETURN_CODES[CID2])
+        return -1
+
+
+class DarenClient(ProtocolClient):
+    """
+    Client of Daren (DR-JC03) modules, SOI `~`.
+    """
+
+    SOI = SOI_DAREN
+
+
+class SnsClient(ProtocolClient):
+    """
+    Client of SNS (Ho01/Ho02) modules, SOI `>`.
+    """
+
+    SOI = SOI_SNS
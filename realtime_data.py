@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Decoder of the INFO field of the Service 42 (realtime data) response of Daren and SNS modules.
+
+The INFO field is ASCII hex. It is converted to bytes once and unpacked in a single pass with the precompiled
+REALTIME_DATA_STRUCT into a RealtimeData record, instead of converting every field from its own slice of the
+hex string. Offsets below are in bytes of the converted payload (hex character offset / 2):
+
+    0  data flag          1  SOC (H)              3  voltage (H)          5  cell count
+    6  16 cell voltages (H)                      38  (unused)            42  MOS temperature (h)
+   44  temperature count 45  4 cell temperatures (h)                     53  current (h)
+   55  (unused)          57  SOH (H)             59  (unused)            60  capacity (H)
+   62  remaining capacity (H)                    64  charge cycles (H)
+   66  voltage, current, temperature, warning and FET status words (H)
+"""
+from binascii import unhexlify
+from struct import Struct
+from typing import NamedTuple, Tuple, Union
+
+
+REALTIME_DATA_STRUCT = Struct(">xHHx16H4xhx4hh2xHx3H5H")
+"""
+Layout of the converted payload, REALTIME_DATA_STRUCT.size (76) bytes
+"""
+
+REALTIME_DATA_LENGTH = REALTIME_DATA_STRUCT.size * 2
+"""
+Number of hex characters of the payload needed to decode a record
+"""
+
+
+class RealtimeData(NamedTuple):
+    """
+    Decoded Service 42 payload, in the units the drivers report.
+    """
+
+    soc: float  # %
+    voltage: float  # V
+    cell_voltages: Tuple[float, ...]  # V, 16 cells
+    temperature_mos: float  # °C
+    temperatures: Tuple[float, ...]  # °C, 4 sensors
+    current: float  # A, negative while discharging
+    soh: int  # %
+    capacity: float  # Ah
+    capacity_remaining: float  # Ah
+    charge_cycles: int
+    voltage_status: int
+    current_status: int
+    temperature_status: int
+    warning_status: int
+    fet_status: int
+
+
+def decode_realtime_data(payload: Union[bytes, str]) -> RealtimeData:
+    """
+    Decode the payload of a Service 42 response.
+
+    :param payload: INFO field as ASCII hex, at least REALTIME_DATA_LENGTH characters, longer payloads are cut
+    :return: Decoded record
+    """
+    if len(payload) < REALTIME_DATA_LENGTH:
+        raise ValueError(f"realtime data payload too short ({len(payload)} < {REALTIME_DATA_LENGTH} characters)")
+    values = REALTIME_DATA_STRUCT.unpack_from(unhexlify(payload[:REALTIME_DATA_LENGTH]))
+    return RealtimeData(
+        values[0] / 100,
+        values[1] / 100,
+        tuple([voltage / 1000 for voltage in values[2:18]]),
+        values[18] / 10,
+        tuple([temperature / 10 for temperature in values[19:23]]),
+        values[23] / 100,
+        values[24],
+        values[25] / 100,
+        values[26] / 100,
+        *values[27:],
+    )
@@ -0,0 +1,437 @@
+# -*- coding: utf-8 -*-
+"""
+Pty based simulators of the Daren master (JC03) and the SNS slaves for testing the bridge without RS485 hardware.
+
+Each simulator owns the master side of a pty pair, the bridge opens the slave side (`port`) like a serial device:
+
+    DarenMasterSimulator  <-- pty -->  DarenSNSBridge  <-- pty -->  SnsSlaveSimulator
+
+Bytes are paced at the configured baud rate (10 bit times per byte), so a 216 byte Service 42 response takes
+as long as on a real 9600 baud bus.
+
+Usage: python simulator.py [--rates 2,5,10] [--duration 10] [--addresses 08] [--buses 1] [--sns-delay 0.05]
+                           [--sns-baud 9600] [--daren-baud 19200] [--external]
+
+Without --external the bridge is started in-process for every rate and a latency table is printed,
+with --external only the simulators run and the pty paths to configure in the bridge are printed.
+"""
+import argparse
+import fcntl
+import os
+import re
+import struct
+import termios
+import threading
+import tty
+from time import monotonic, sleep
+from typing import Dict, List, Optional, Tuple, Union
+
+from metrics import Histogram
+from parse import ho
+from protocol import SOI_DAREN, SOI_SNS, Frame, FrameError, decode_frame, encode_command, encode_frame
+from utils import FrameReader, logger
+
+
+DOCS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "docs", "daren_485_README.md")
+
+ServiceKey = Tuple[int, Optional[int]]
+"""
+Service answered by a simulated module: CID2 of the command and, for service B0, the module
+"""
+
+
+def byte_time(baud: int) -> float:
+    """
+    Seconds needed to transfer one byte (start bit, 8 data bits, stop bit).
+
+    :param baud: Baud rate
+    :return: Seconds per byte
+    """
+    return 10.0 / baud
+
+
+class PtyPort:
+    """
+    Master side of a pty pair, with the part of the `serial.Serial` API used by FrameReader.
+    """
+
+    def __init__(self, baud: int):
+        """
+        :param baud: Baud rate used to pace writes
+        """
+        self.baud = baud
+        self.fd, self._slave_fd = os.openpty()
+        tty.setraw(self.fd)
+        tty.setraw(self._slave_fd)
+        self.port = os.ttyname(self._slave_fd)
+        self.is_open = True
+
+    def fileno(self) -> int:
+        return self.fd
+
+    @property
+    def in_waiting(self) -> int:
+        return struct.unpack("I", fcntl.ioctl(self.fd, termios.FIONREAD, b"\0\0\0\0"))[0]
+
+    def read(self, size: int = 1) -> bytes:
+        return os.read(self.fd, size)
+
+    def write(self, data: bytes) -> int:
+        """
+        Write data at the pace of the baud rate. Bytes due at the same time are written together.
+
+        :param data: Bytes to write
+        :return: Number of bytes written
+        """
+        per_byte = byte_time(self.baud)
+        started = monotonic()
+        written = 0
+        while written < len(data):
+            due = min(len(data), int((monotonic() - started) / per_byte) + 1)
+            if due > written:
+                written += os.write(self.fd, data[written:due])
+            else:
+                sleep(per_byte)
+        return written
+
+    def close(self) -> None:
+        if self.is_open:
+            self.is_open = False
+            os.close(self.fd)
+            os.close(self._slave_fd)
+
+
+def sns_response_for(address: int, template: Union[str, bytes, Frame] = ho) -> bytes:
+    """
+    Response of an SNS module, by default the recorded Service 42 frame from parse.py, re-addressed.
+
+    :param address: Module address
+    :param template: Recorded response
+    :return: Response frame
+    """
+    frame = template if isinstance(template, Frame) else decode_frame(template)
+    return encode_frame(frame._replace(adr=address))
+
+
+def service_key(frame: Frame, response: bool = False) -> ServiceKey:
+    """
+    Service of a command, or of a response to it (service B0 responses repeat the CID2 in front of the INFO).
+
+    :param frame: Decoded command or response
+    :param response: True if the frame is a response
+    :return: Tuple of CID2 and the B0 module
+    """
+    info = frame.info[2:] if response else frame.info
+    cid2 = int(frame.info[:2], 16) if response else frame.cid2
+    return (cid2, int(info[4:6], 16) if cid2 == 0xB0 else None)
+
+
+def documented_services(soi: bytes = SOI_DAREN, path: str = DOCS_PATH) -> Dict[ServiceKey, Frame]:
+    """
+    Recorded responses to the commands of the drivers from docs/daren_485_README.md, by service.
+    For SNS modules (SOI_SNS) Service 42 is answered with the recorded SNS frame from parse.py,
+    its payload layout differs from the Daren one.
+
+    :param soi: SOI of the responses
+    :param path: Protocol documentation with the recorded responses
+    :return: Responses by service key
+    """
+    services: Dict[ServiceKey, Frame] = {}
+    service = None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            heading = re.match(r"## Service ([0-9A-F]{2})", line)
+            if heading:
+                service = int(heading.group(1), 16)
+            response = re.match(r"Response: `(~[0-9A-F]+)␍`", line)
+            if response and service is not None:
+                frame = decode_frame(response.group(1) + "\r")._replace(soi=soi)
+                key = service_key(frame, response=True) if service == 0xB0 else (service, None)
+                services.setdefault(key, frame)
+    if soi == SOI_SNS:
+        services[(0x42, None)] = decode_frame(ho)
+    return services
+
+
+class SnsSlaveSimulator:
+    """
+    SNS modules on one bus answering the commands for their address with recorded frames,
+    by default only Service 42 (what the bridge polls), see documented_services for the driver commands.
+    """
+
+    def __init__(
+        self,
+        addresses: List[int],
+        baud: int = 9600,
+        response_delay: float = 0.05,
+        services: Union[Dict[ServiceKey, Frame], None] = None,
+    ):
+        """
+        :param addresses: Addresses of the simulated modules
+        :param baud: Baud rate of the bus
+        :param response_delay: Seconds between the end of a command and the first byte of the response
+        :param services: Recorded responses by service key, defaults to the Service 42 frame from parse.py
+        """
+        self.pty = PtyPort(baud)
+        self.port = self.pty.port
+        self.addresses = addresses
+        self.response_delay = response_delay
+        services = services or {(0x42, None): decode_frame(ho)}
+        self.responses: Dict[Tuple[int, ServiceKey], bytes] = {
+            (address, key): sns_response_for(address, frame) for address in addresses for key, frame in services.items()
+        }
+        self.requests = 0
+        self.running = False
+        self._thread = None
+
+    def start(self) -> None:
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="SnsSlaveSimulator", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.running = False
+        if self._thread:
+            self._thread.join(timeout=2)
+
+    def close(self) -> None:
+        """
+        Close the pty, stop the bridge first or it sees the port vanish.
+        """
+        self.pty.close()
+
+    def _run(self) -> None:
+        reader = FrameReader(self.pty)
+        while self.running:
+            try:
+                command = reader.read_frame(0.2)
+            except OSError:
+                return
+            if command is None:
+                continue
+            try:
+                frame = decode_frame(command)
+            except FrameError as e:
+                logger.warning(f"SNS simulator ignoring invalid command {command}: {e}")
+                continue
+            response = self.responses.get((frame.adr, service_key(frame)))
+            if response is None:
+                continue
+            self.requests += 1
+            sleep(self.response_delay)
+            self.pty.write(response)
+
+
+class DarenMasterSimulator:
+    """
+    Daren master polling addresses with Service 42 at a fixed rate and timing the replies.
+    """
+
+    def __init__(self, addresses: List[int], baud: int = 19200, rate: float = 2.0, reply_timeout: float = 0.5):
+        """
+        :param addresses: Addresses polled in turn
+        :param baud: Baud rate of the bus
+        :param rate: Polls per second over all addresses
+        :param reply_timeout: Seconds the master waits for a reply before it moves on
+        """
+        self.pty = PtyPort(baud)
+        self.port = self.pty.port
+        self.addresses = addresses
+        self.rate = rate
+        self.reply_timeout = reply_timeout
+        self.requests: Dict[int, bytes] = {
+            address: encode_command(SOI_DAREN, address, 0x4A, 0x42, b"%02X" % address) for address in addresses
+        }
+        self.latency = Histogram()
+        self.polls = 0
+        self.timeouts = 0
+        self.invalid = 0
+        self.running = False
+        self._thread = None
+        self._started_at = None
+        self._stopped_at = None
+
+    def start(self) -> None:
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="DarenMasterSimulator", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.running = False
+        if self._thread:
+            self._thread.join(timeout=2)
+
+    def close(self) -> None:
+        """
+        Close the pty, stop the bridge first or it sees the port vanish.
+        """
+        self.pty.close()
+
+    def reset(self) -> None:
+        """
+        Drop the statistics collected so far, e.g. after a warm-up.
+        """
+        self.latency = Histogram()
+        self.polls = self.timeouts = self.invalid = 0
+        self._started_at = monotonic()
+
+    def stats(self) -> Dict[str, Union[float, int, None]]:
+        """
+        Statistics since the start or the last reset.
+
+        :return: Achieved poll rate, latency percentiles in seconds and error counts
+        """
+        elapsed = (self._stopped_at or monotonic()) - self._started_at
+        return {
+            "polls": self.polls,
+            "achieved_rate": self.polls / elapsed if elapsed > 0 else 0.0,
+            "p50": self.latency.percentile(50),
+            "p95": self.latency.percentile(95),
+            "p99": self.latency.percentile(99),
+            "max": self.latency.max if self.latency.count else None,
+            "timeouts": self.timeouts,
+            "invalid": self.invalid,
+        }
+
+    def _run(self) -> None:
+        reader = FrameReader(self.pty)
+        interval = 1.0 / self.rate
+        self._started_at = next_poll = monotonic()
+        index = 0
+        while self.running:
+            address = self.addresses[index % len(self.addresses)]
+            index += 1
+            reader.reset()
+            self.pty.write(self.requests[address])
+            sent_at = monotonic()
+            self.polls += 1
+            try:
+                reply = reader.read_frame(self.reply_timeout)
+            except OSError:
+                break
+            if reply is None:
+                self.timeouts += 1
+            else:
+                self.latency.observe(monotonic() - sent_at)
+                try:
+                    if decode_frame(reply).adr != address:
+                        self.invalid += 1
+                except FrameError:
+                    self.invalid += 1
+
+            next_poll += interval
+            delay = next_poll - monotonic()
+            if delay > 0:
+                sleep(delay)
+            else:
+                next_poll = monotonic()  # behind schedule, poll again right away
+        self._stopped_at = monotonic()
+
+
+def run_load_test(
+    rate: float,
+    duration: float,
+    addresses: List[int],
+    sns_delay: float,
+    bridge_kwargs: dict,
+    buses: int = 1,
+    sns_baud: int = 9600,
+    daren_baud: int = 19200,
+) -> Dict:
+    """
+    Run the bridge in-process between the simulators at one poll rate.
+
+    :param buses: Number of SNS buses, the addresses are spread over them in turn
+    :param sns_baud: Baud rate of the SNS buses
+    :param daren_baud: Baud rate of the Daren master line
+    :return: Statistics of the master simulator
+    """
+    from daren_sns_bridge import DarenSNSBridge
+
+    buses = max(1, min(buses, len(addresses)))
+    bus_slaves = [SnsSlaveSimulator(addresses[i::buses], sns_baud, sns_delay) for i in range(buses)]
+    master = DarenMasterSimulator(addresses, daren_baud, rate)
+    routes = {bytes([address]): (slaves.port, sns_baud) for slaves in bus_slaves for address in slaves.addresses}
+    bridge = DarenSNSBridge(
+        master.port, bus_slaves[0].port, daren_baud, sns_baud, [bytes([address]) for address in addresses], sns_routes=routes, **bridge_kwargs
+    )
+    for slaves in bus_slaves:
+        slaves.start()
+    bridge.start()
+    sleep(0.5)  # let the bridge open its ports
+    master.start()
+    sleep(min(1.0, duration / 5))
+    master.reset()
+    sleep(duration)
+    stats = master.stats()
+    master.stop()
+    bridge.stop()
+    for slaves in bus_slaves:
+        slaves.stop()
+        slaves.close()
+    master.close()
+    return stats
+
+
+def format_ms(value: Union[float, None]) -> str:
+    return "     -" if value is None else f"{value * 1000:6.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Daren master and SNS slave simulators")
+    parser.add_argument("--rates", default="2,5,10,20", help="comma separated poll rates (polls/s) to test")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per rate")
+    parser.add_argument("--addresses", default="08", help="comma separated hex addresses of the SNS modules")
+    parser.add_argument("--buses", type=int, default=1, help="number of SNS buses the addresses are spread over")
+    parser.add_argument("--sns-delay", type=float, default=0.05, help="seconds before an SNS module starts to answer")
+    parser.add_argument("--sns-baud", type=int, default=9600, help="baud rate of the SNS buses, e.g. 9600 or 19200")
+    parser.add_argument("--daren-baud", type=int, default=19200, help="baud rate of the Daren master line")
+    parser.add_argument("--prefetch-interval", type=float, default=None, help="bridge prefetch interval in seconds")
+    parser.add_argument("--reply-deadline", type=float, default=None, help="bridge reply deadline in seconds")
+    parser.add_argument("--external", action="store_true", help="only run the simulators and print their ports")
+    args = parser.parse_args()
+
+    addresses = [int(address, 16) for address in args.addresses.split(",")]
+    rates = [float(rate) for rate in args.rates.split(",")]
+
+    if args.external:
+        slaves = SnsSlaveSimulator(addresses, args.sns_baud, args.sns_delay)
+        master = DarenMasterSimulator(addresses, args.daren_baud, rates[0])
+        slaves.start()
+        print(f"DAREN_PORT={master.port} SNS_PORT={slaves.port}, press Enter to start polling at {rates[0]} polls/s")
+        input()
+        master.start()
+        try:
+            while True:
+                sleep(args.duration)
+                stats = master.stats()
+                print(
+                    f"{stats['achieved_rate']:6.2f} polls/s  p50 {format_ms(stats['p50'])} ms  p99 {format_ms(stats['p99'])} ms"
+                    f"  timeouts {stats['timeouts']}"
+                )
+                master.reset()
+        except KeyboardInterrupt:
+            master.stop()
+            slaves.stop()
+            master.close()
+            slaves.close()
+        return
+
+    bridge_kwargs = {"prefetch_interval": args.prefetch_interval, "reply_deadline": args.reply_deadline}
+    if args.reply_deadline is not None:
+        bridge_kwargs["stale_limit"] = 30.0
+    rows: List[Tuple[float, Dict]] = []
+    for rate in rates:
+        rows.append((rate, run_load_test(rate, args.duration, addresses, args.sns_delay, bridge_kwargs, args.buses, args.sns_baud, args.daren_baud)))
+
+    print(f"\n{'rate':>6} {'achieved':>9} {'polls':>6} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'max ms':>7} {'timeouts':>9} {'invalid':>8}")
+    for rate, stats in rows:
+        print(
+            f"{rate:6.1f} {stats['achieved_rate']:9.2f} {stats['polls']:6d} {format_ms(stats['p50'])} "
+            f"{format_ms(stats['p95'])} {format_ms(stats['p99'])} {format_ms(stats['max'])} "
+            f"{stats['timeouts']:9d} {stats['invalid']:8d}"
+        )
+
+
+if __name__ == "__main__":
+    main()
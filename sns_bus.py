@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+import itertools
+import queue
+import threading
+from concurrent.futures import Future
+from time import monotonic, sleep
+from typing import Union
+
+import serial
+
+from metrics import metrics, RequestTrace
+from protocol_client import SnsClient
+from utils import logger
+
+
+PRIORITY_MASTER = 0
+"""
+Priority of transactions answering a request of the Daren master
+"""
+PRIORITY_PREFETCH = 1
+"""
+Priority of background transactions, e.g. the prefetch polls
+"""
+PRIORITY_NAMES = {PRIORITY_MASTER: "master", PRIORITY_PREFETCH: "prefetch"}
+
+
+class SnsBus:
+    """
+    Owner and arbiter of one half-duplex SNS RS485 bus.
+
+    The serial port is opened once and kept open by the SnsClient of the bus, shared by all addresses on it.
+    All transactions are executed one after the other by a single worker thread, which holds the line from the write of a command until its response is
+    complete or timed out, so a request and its response can never interleave with another one.
+    Waiting transactions are served by priority (master requests before prefetch polls), in submission
+    order within a priority, and the line is left idle for the turnaround gap between two transactions.
+    If the link fails the port is closed and reopened transparently on the next transaction.
+    """
+
+    def __init__(self, port: str, baud: int, timeout: float = 1.0, turnaround: float = 0.0):
+        """
+        :param port: Serial port of the bus
+        :param baud: Baud rate of the bus
+        :param timeout: Default deadline in seconds for a complete response frame
+        :param turnaround: Seconds the line stays idle after a transaction before the next command is sent
+        """
+        self.port = port
+        self.baud = baud
+        self.timeout = timeout
+        self.turnaround = turnaround
+        self.running = False
+        self.client = SnsClient(port, baud)
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()  # keeps the submission order within a priority
+        self._released_at = None  # when the last transaction released the line
+        self._thread = None
+        self._opened_before = False  # a later open is a reconnect
+        self.reconnects = 0  # Reopens of the port after the first open
+        self.busy_seconds = 0.0  # Time spent in transactions since the start
+        self._sampled_at = monotonic()
+        self._sampled_busy = 0.0
+
+    def start(self) -> None:
+        """
+        Start the worker thread of the bus.
+        """
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name=f"SnsBus-{self.port}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the worker thread and close the port.
+        """
+        self.running = False
+        self._queue.put((PRIORITY_MASTER - 1, next(self._sequence), None))
+        if self._thread:
+            self._thread.join(timeout=2)
+        self._close()
+        logger.info(f"SNS bus {self.port} stopped. {metrics.summary()}")
+
+    def submit(
+        self,
+        command: bytes,
+        timeout: Union[float, None] = None,
+        trace: Union[RequestTrace, None] = None,
+        priority: int = PRIORITY_MASTER,
+    ) -> Future:
+        """
+        Queue a transaction on the bus.
+
+        :param command: Complete command frame to send
+        :param timeout: Deadline in seconds for the response, defaults to the bus timeout
+        :param trace: Trace of the master request, receives the sns_write, sns_first_byte and sns_frame_complete stages
+        :param priority: PRIORITY_MASTER or PRIORITY_PREFETCH, lower values are served first
+        :return: Future resolving to the response frame or None if there was no response
+        """
+        future = Future()
+        item = (command, self.timeout if timeout is None else timeout, future, trace, monotonic())
+        self._queue.put((priority, next(self._sequence), item))
+        return future
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        Number of transactions waiting for the bus.
+        """
+        return self._queue.qsize()
+
+    def sample_utilisation(self) -> float:
+        """
+        Fraction of the time the bus was busy with transactions since the previous sample (or the start).
+        A value close to 1 means the segment is saturated and transactions wait for each other.
+
+        :return: Utilisation between 0 and 1
+        """
+        now = monotonic()
+        busy = self.busy_seconds
+        elapsed = now - self._sampled_at
+        utilisation = (busy - self._sampled_busy) / elapsed if elapsed > 0 else 0.0
+        self._sampled_at = now
+        self._sampled_busy = busy
+        return min(1.0, utilisation)
+
+    def transact(self, command: bytes, timeout: Union[float, None] = None, priority: int = PRIORITY_MASTER) -> Union[bytes, None]:
+        """
+        Send a command and wait for its response.
+
+        :param command: Complete command frame to send
+        :param timeout: Deadline in seconds for the response, defaults to the bus timeout
+        :param priority: PRIORITY_MASTER or PRIORITY_PREFETCH, lower values are served first
+        :return: Response frame or None if there was no response
+        """
+        return self.submit(command, timeout, priority=priority).result()
+
+    def _run(self) -> None:
+        while self.running:
+            priority, _, item = self._queue.get()
+            if item is None:
+                break
+            command, timeout, future, trace, submitted_at = item
+            if not future.set_running_or_notify_cancel():
+                metrics.inc("sns_bus_cancelled_total", bus=self.port, priority=PRIORITY_NAMES.get(priority, str(priority)))
+                continue
+            self._wait_turnaround()
+            started = monotonic()
+            metrics.observe("sns_bus_wait_seconds", started - submitted_at, bus=self.port, priority=PRIORITY_NAMES.get(priority, str(priority)))
+            try:
+                future.set_result(self._transact(command, timeout, trace))
+            except Exception as e:
+                logger.error(f"Unexpected error in SNS transaction on {self.port}: {e}")
+                future.set_exception(e)
+            finally:
+                self._released_at = monotonic()
+                elapsed = self._released_at - started
+                self.busy_seconds += elapsed
+                metrics.inc("sns_bus_busy_seconds_total", elapsed, bus=self.port)
+
+    def _wait_turnaround(self) -> None:
+        # the slave needs the line idle for a moment after its response before it listens again
+        if self._released_at is None or self.turnaround <= 0:
+            return
+        remaining = self._released_at + self.turnaround - monotonic()
+        if remaining > 0:
+            sleep(remaining)
+
+    def _transact(self, command: bytes, timeout: float, trace: Union[RequestTrace, None] = None) -> Union[bytes, None]:
+        # a failing link gets one reconnect before the transaction is given up
+        for attempt in range(2):
+            if not self._ensure_open():
+                return None
+            try:
+                metrics.inc("sns_transactions_total", bus=self.port)
+                return self.client.transact(command, timeout, trace)
+            except (serial.SerialException, OSError) as e:
+                logger.warning(f"SNS bus {self.port} failed (attempt {attempt + 1}): {e}. Reconnecting...")
+                metrics.inc("sns_port_errors_total", bus=self.port)
+                self._close()
+        return None
+
+    def _ensure_open(self) -> bool:
+        if self.client.is_open:
+            return True
+
+        started = monotonic()
+        opened = self.client.open()
+        elapsed = monotonic() - started
+        if not opened:
+            logger.error(f"Failed to open SNS slave port {self.port}.")
+            return False
+
+        metrics.inc("sns_port_opens_total", bus=self.port)
+        metrics.inc("sns_port_open_seconds_total", elapsed, bus=self.port)
+        if self._opened_before:
+            self.reconnects += 1
+            metrics.inc("sns_port_reconnects_total", bus=self.port)
+            logger.info(
+                f"Reconnected SNS bus {self.port} @ {self.baud} in {elapsed * 1000:.1f} ms "
+                f"(reconnects: {self.reconnects})"
+            )
+        else:
+            self._opened_before = True
+            logger.info(f"Opened SNS bus {self.port} @ {self.baud} in {elapsed * 1000:.1f} ms")
+        return True
+
+    def _close(self) -> None:
+        self.client.close()
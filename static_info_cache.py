@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import threading
+from typing import Dict, Union
+
+from utils import logger, DAREN_STATIC_INFO_CACHE
+
+
+class StaticInfoCache:
+    """
+    Static identity data of batteries (serial number, hardware version, cell count) persisted in a JSON file,
+    keyed by battery type, port and address, so a restarted driver does not have to read it from the BMS again.
+    """
+
+    FIELDS = ("serial_number", "hardware_version", "cell_count")
+
+    def __init__(self, path: Union[str, None]):
+        """
+        :param path: JSON file holding the cache, None or "" disables the cache
+        """
+        self.path = path or None
+        self._lock = threading.Lock()
+        self._entries: Union[Dict[str, Dict], None] = None
+
+    @staticmethod
+    def key(battery_type: str, port: str, address: bytes) -> str:
+        """
+        :param battery_type: BATTERYTYPE of the driver
+        :param port: Port of the battery
+        :param address: Address of the battery
+        :return: Key of the battery in the cache
+        """
+        return f"{battery_type}:{port}:{address.hex()}"
+
+    def get(self, key: str) -> Union[Dict, None]:
+        """
+        Get the cached static info of a battery.
+
+        :param key: Key from StaticInfoCache.key
+        :return: Dict with the FIELDS or None if the battery is not cached
+        """
+        if not self.path:
+            return None
+        with self._lock:
+            entry = self._load().get(key)
+        if entry is None or any(field not in entry for field in self.FIELDS):
+            return None
+        return dict(entry)
+
+    def put(self, key: str, **info) -> None:
+        """
+        Store the static info of a battery and write the cache file.
+
+        :param key: Key from StaticInfoCache.key
+        :param info: Values of the FIELDS
+        """
+        if not self.path:
+            return
+        with self._lock:
+            entries = self._load()
+            entry = {field: info[field] for field in self.FIELDS}
+            if entries.get(key) != entry:
+                entries[key] = entry
+                self._save(entries)
+
+    def invalidate(self, key: str) -> None:
+        """
+        Drop the cached static info of a battery, e.g. after the module was swapped.
+
+        :param key: Key from StaticInfoCache.key
+        """
+        if not self.path:
+            return
+        with self._lock:
+            entries = self._load()
+            if entries.pop(key, None) is not None:
+                self._save(entries)
+
+    def _load(self) -> Dict[str, Dict]:
+        if self._entries is None:
+            self._entries = {}
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    entries = json.load(f)
+                if isinstance(entries, dict):
+                    self._entries = entries
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable static info cache {self.path}: {e}")
+        return self._entries
+
+    def _save(self, entries: Dict[str, Dict]) -> None:
+        # write to a temporary file first, an interrupted write never leaves a truncated cache behind
+        temporary_path = f"{self.path}.tmp"
+        try:
+            with open(temporary_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f, indent=2, sort_keys=True)
+            os.replace(temporary_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not write static info cache {self.path}: {e}")
+
+
+static_info_cache = StaticInfoCache(DAREN_STATIC_INFO_CACHE)
+"""
+Cache shared by the Daren drivers of the process
+"""
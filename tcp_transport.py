@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+import errno
+import fcntl
+import select
+import socket
+import struct
+import termios
+from time import monotonic
+from typing import Tuple, Union
+from urllib.parse import urlsplit
+
+import serial
+
+
+TCP_URL_SCHEMES = ("socket", "tcp")
+"""
+URL schemes accepted for RS485-Ethernet gateways, e.g. `socket://192.168.1.53:4196`
+"""
+
+
+def is_tcp_url(port: str) -> bool:
+    """
+    Check if a port is a TCP endpoint instead of a serial device.
+
+    :param port: Serial device or URL
+    :return: True if the port is a `socket://` or `tcp://` URL
+    """
+    return isinstance(port, str) and urlsplit(port).scheme.lower() in TCP_URL_SCHEMES
+
+
+def parse_tcp_url(url: str) -> Tuple[str, int]:
+    """
+    Extract host and port from a `socket://host:port` or `tcp://host:port` URL.
+
+    :param url: URL of the gateway
+    :return: Tuple of host and port
+    """
+    parts = urlsplit(url)
+    if parts.scheme.lower() not in TCP_URL_SCHEMES or not parts.hostname or parts.port is None:
+        raise serial.SerialException(f"expected a URL in the form socket://<host>:<port> or tcp://<host>:<port>, got {url!r}")
+    return parts.hostname, parts.port
+
+
+class TcpSerial:
+    """
+    Direct TCP connection to a transparent RS485-Ethernet gateway.
+
+    Provides the part of the `serial.Serial` API used by the bridge and the drivers, so it can be used
+    wherever a serial port is expected. Unlike the `socket://` handler of pyserial, `in_waiting` returns
+    the real number of queued bytes, so a FrameReader can drain the socket in a single read.
+    """
+
+    def __init__(self, url: str, timeout: float = 0.1, connect_timeout: float = 3.0, keepalive_idle: int = 10):
+        """
+        :param url: URL of the gateway, e.g. `socket://192.168.1.53:4196`
+        :param timeout: Read timeout in seconds
+        :param connect_timeout: Timeout in seconds for establishing the connection
+        :param keepalive_idle: Idle seconds before TCP keepalive probes are sent
+        """
+        self.port = url
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.keepalive_idle = keepalive_idle
+        self.host, self.tcp_port = parse_tcp_url(url)
+        self.is_open = False
+        self._socket = None
+        self.open()
+
+    def open(self) -> None:
+        """
+        Connect to the gateway.
+        """
+        try:
+            sock = socket.create_connection((self.host, self.tcp_port), timeout=self.connect_timeout)
+        except OSError as e:
+            raise serial.SerialException(f"could not connect to {self.port}: {e}")
+
+        # frames are small and latency bound, never wait to coalesce them
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # detect a gateway that vanished without closing the connection
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        if hasattr(socket, "TCP_KEEPIDLE"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, self.keepalive_idle)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(1, self.keepalive_idle // 2))
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3)
+        sock.setblocking(False)
+        self._socket = sock
+        self.is_open = True
+
+    def close(self) -> None:
+        """
+        Close the connection.
+        """
+        if self._socket is not None:
+            try:
+                self._socket.close()
+            except OSError:
+                pass
+            self._socket = None
+        self.is_open = False
+
+    def reconnect(self) -> None:
+        """
+        Drop the connection and connect again.
+        """
+        self.close()
+        self.open()
+
+    def fileno(self) -> int:
+        if not self.is_open:
+            raise serial.PortNotOpenError()
+        return self._socket.fileno()
+
+    @property
+    def in_waiting(self) -> int:
+        """
+        Number of bytes queued in the socket receive buffer.
+        """
+        if not self.is_open:
+            raise serial.PortNotOpenError()
+        buf = fcntl.ioctl(self._socket.fileno(), termios.FIONREAD, b"\0\0\0\0")
+        return struct.unpack("I", buf)[0]
+
+    def read(self, size: int = 1) -> bytes:
+        """
+        Read up to size bytes, waiting at most `timeout` seconds for them.
+
+        :param size: Number of bytes to read
+        :return: Bytes read, may be less than size on timeout
+        """
+        if not self.is_open:
+            raise serial.PortNotOpenError()
+        data = bytearray()
+        deadline = None if self.timeout is None else monotonic() + self.timeout
+        while len(data) < size:
+            remaining = None if deadline is None else max(0.0, deadline - monotonic())
+            ready, _, _ = select.select([self._socket], [], [], remaining)
+            if not ready:
+                break
+            try:
+                chunk = self._socket.recv(size - len(data))
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    continue
+                raise serial.SerialException(f"read from {self.port} failed: {e}")
+            if not chunk:
+                raise serial.SerialException(f"{self.port} disconnected")
+            data.extend(chunk)
+        return bytes(data)
+
+    def write(self, data: Union[bytes, bytearray]) -> int:
+        """
+        Send all bytes to the gateway.
+
+        :param data: Bytes to send
+        :return: Number of bytes sent
+        """
+        if not self.is_open:
+            raise serial.PortNotOpenError()
+        view = memoryview(data)
+        while view:
+            try:
+                sent = self._socket.send(view)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    select.select([], [self._socket], [], self.connect_timeout)
+                    continue
+                raise serial.SerialException(f"write to {self.port} failed: {e}")
+            view = view[sent:]
+        return len(data)
+
+    def flush(self) -> None:
+        # TCP_NODELAY pushes every write out immediately
+        pass
+
+    def reset_input_buffer(self) -> None:
+        """
+        Discard all bytes already received.
+        """
+        while self.is_open and self.in_waiting:
+            try:
+                if not self._socket.recv(4096):
+                    raise serial.SerialException(f"{self.port} disconnected")
+            except BlockingIOError:
+                break
+
+    def reset_output_buffer(self) -> None:
+        pass
+
+    # legacy pyserial names used by the drivers
+    flushInput = reset_input_buffer
+    flushOutput = reset_output_buffer
+
+    def inWaiting(self) -> int:
+        return self.in_waiting
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -1,17 +1,25 @@
 # -*- coding: utf-8 -*-
 # Standard library imports
+import atexit
 import bisect
 import configparser
 import logging
+import logging.handlers
+import queue
+import select
 import sys
+import threading
 from pathlib import Path
 from struct import unpack_from
-from time import sleep
+from time import monotonic, sleep
 from typing import List, Any, Callable, Union
 
 # Third-party imports
 import serial
 
+# Local imports
+from tcp_transport import TcpSerial, is_tcp_url
+
 
 # CONSTANTS
 DRIVER_VERSION: str = "2.0.20250107dev"
@@ -31,13 +39,26 @@ degree sign (`°`)
 
 
 # LOGGING
-logging.basicConfig(
-    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
+# Records are handed to a queue and written to stderr by a QueueListener thread,
+# so the serial and worker threads never block on the console.
+log_queue = queue.SimpleQueue()
+log_stream_handler = logging.StreamHandler()
+log_stream_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s", datefmt="%Y-%m-%d %H:%M:%S"))
+log_listener = logging.handlers.QueueListener(log_queue, log_stream_handler, respect_handler_level=True)
+log_listener.start()
+atexit.register(log_listener.stop)
+
+log_queue_handler = logging.handlers.QueueHandler(log_queue)
+log_queue_handler.setFormatter(logging.Formatter("%(message)s"))  # the listener's handler adds time, level and name
+logging.basicConfig(handlers=[log_queue_handler])
 
 logger = logging.getLogger("DarenSnsBridge")
 
+traffic_logger = logging.getLogger("DarenSnsBridge.traffic")
+"""
+Per-frame traffic (raw requests, responses and replies), switched on and rate limited independently of `logger`
+"""
+
 PATH_CONFIG_DEFAULT: str = "config.default.ini"
 PATH_CONFIG_USER: str = "config.ini"
 
@@ -126,7 +147,57 @@ def check_config_issue(condition: bool, message: str):
         errors_in_config.append(f"**CONFIG ISSUE**: {message}")
 
 
+class RateLimitFilter(logging.Filter):
+    """
+    Token bucket filter letting at most `rate` records per second through, with bursts of up to `burst` records.
+    Suppressed records are counted and reported with the next record that passes.
+    """
+
+    def __init__(self, rate: float, burst: int = 10):
+        """
+        :param rate: Records per second, 0 disables the limit
+        :param burst: Records that may pass at once after a quiet period
+        """
+        super().__init__()
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated_at = monotonic()
+        self._suppressed = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            if self._tokens < 1:
+                self._suppressed += 1
+                return False
+            self._tokens -= 1
+            suppressed, self._suppressed = self._suppressed, 0
+        if suppressed:
+            record.msg = f"({suppressed} messages suppressed) {record.msg}"
+        return True
+
+
 # SAVE CONFIG VALUES to constants
+# --------- Logging ---------
+TRAFFIC_LOGGING: bool = get_bool_from_config("DEFAULT", "TRAFFIC_LOGGING")
+"""
+Log every frame exchanged with the Daren master and the SNS slaves
+"""
+TRAFFIC_LOG_RATE: float = get_float_from_config("DEFAULT", "TRAFFIC_LOG_RATE", 10)
+"""
+Maximum number of traffic messages per second, 0 disables the limit
+"""
+
+# Traffic is logged at INFO, it is only shown when switched on even if the main level is DEBUG
+traffic_logger.setLevel(logging.INFO if TRAFFIC_LOGGING else logging.CRITICAL + 1)
+traffic_logger.addFilter(RateLimitFilter(TRAFFIC_LOG_RATE))
+
 # --------- Battery Current Limits ---------
 MAX_BATTERY_CHARGE_CURRENT: float = get_float_from_config("DEFAULT", "MAX_BATTERY_CHARGE_CURRENT")
 """
@@ -457,6 +528,16 @@ LIPRO_START_ADDRESS: int = get_int_from_config("DEFAULT", "LIPRO_START_ADDRESS")
 LIPRO_END_ADDRESS: int = get_int_from_config("DEFAULT", "LIPRO_END_ADDRESS")
 LIPRO_CELL_COUNT: int = get_int_from_config("DEFAULT", "LIPRO_CELL_COUNT")
 
+# -- Daren485 and Daren485v2 settings
+DAREN_CAP_PARAMS_EVERY_POLLS: int = get_int_from_config("DEFAULT", "DAREN_CAP_PARAMS_EVERY_POLLS", 10)
+DAREN_CELL_PARAMS_EVERY_MINUTES: float = get_float_from_config("DEFAULT", "DAREN_CELL_PARAMS_EVERY_MINUTES", 10)
+DAREN_STATIC_INFO_CACHE: Union[str, None] = (
+    str(path.joinpath(config["DEFAULT"]["DAREN_STATIC_INFO_CACHE"])) if config["DEFAULT"].get("DAREN_STATIC_INFO_CACHE") else None
+)
+"""
+File caching the static info of the Daren batteries, None disables the cache
+"""
+
 
 # FUNCTIONS
 def constrain(val: float, min_val: float, max_val: float) -> float:
@@ -584,17 +665,21 @@ def bytearray_to_string(data: bytearray) -> str:
     return "".join(f"\\x{byte:02x}" for byte in data)
 
 
-def open_serial_port(port: str, baud: int) -> Union[serial.Serial, None]:
+def open_serial_port(port: str, baud: int) -> Union[serial.Serial, TcpSerial, None]:
     """
     Open a serial port.
+    RS485-Ethernet gateways can be used directly with a `socket://host:port` or `tcp://host:port` URL,
+    the baud rate is then set on the gateway itself.
 
-    :param port: Serial port
+    :param port: Serial port or URL of the gateway
     :param baud: Baud rate
     :return: Opened serial port or None if failed
     """
     tries = 3
     while tries > 0:
         try:
+            if is_tcp_url(port):
+                return TcpSerial(port, timeout=0.1)
             return serial.Serial(port, baudrate=baud, timeout=0.1, rtscts=False)
         except serial.SerialException as e:
             logger.error(e)
@@ -602,6 +687,117 @@ def open_serial_port(port: str, baud: int) -> Union[serial.Serial, None]:
     return None
 
 
+class FrameReader:
+    """
+    Incremental reader for terminator delimited frames (YD/T1363 frames end with CR, 0x0D).
+
+    The reader blocks on the file descriptor of the port with ``select()`` instead of polling,
+    pulls every byte that is available in one read into a preallocated buffer and splits complete
+    frames out of it. Bytes following a complete frame are kept for the next call, so a reader
+    has to be created once per port and reused for its whole lifetime.
+    """
+
+    def __init__(self, ser: serial.Serial, terminator: bytes = b"\r", buffer_size: int = 4096):
+        """
+        :param ser: Opened serial port (or any object providing `fileno()`, `in_waiting` and `read()`)
+        :param terminator: Byte that marks the end of a frame
+        :param buffer_size: Size of the receive buffer, frames longer than this are discarded
+        """
+        self.ser = ser
+        self.terminator = terminator
+        self._buffer = bytearray(buffer_size)
+        self._length = 0
+        # position up to which the buffer was already searched for a terminator
+        self._scanned = 0
+        # monotonic() timestamps of the reads that delivered the first byte of the buffered frame
+        # and of the last frame returned by read_frame
+        self._first_byte_at = None
+        self._filled_at = None
+        self.frame_first_byte_at = None
+        try:
+            self._fd = ser.fileno()
+        except (AttributeError, OSError, ValueError):
+            self._fd = None
+
+    def reset(self) -> None:
+        """
+        Drop all buffered partial data.
+        """
+        self._length = 0
+        self._scanned = 0
+        self._first_byte_at = None
+
+    def read_frame(self, timeout: Union[float, None] = None) -> Union[bytes, None]:
+        """
+        Return the next complete frame including its terminator.
+
+        :param timeout: Overall deadline in seconds, `None` waits forever
+        :return: Frame or None if no complete frame arrived before the deadline
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        while True:
+            frame = self._pop_frame()
+            if frame is not None:
+                return frame
+
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    return None
+
+            if self._wait_readable(remaining):
+                self._fill()
+
+    def _wait_readable(self, timeout: Union[float, None]) -> bool:
+        if self.ser.in_waiting > 0:
+            return True
+        if self._fd is None:
+            # no file descriptor to block on, fall back to a short sleep
+            sleep(0.005 if timeout is None else min(0.005, timeout))
+            return self.ser.in_waiting > 0
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        return bool(readable)
+
+    def _fill(self) -> None:
+        free = len(self._buffer) - self._length
+        if free == 0:
+            logger.warning(f"Discarding {self._length} bytes without frame terminator")
+            self.reset()
+            free = len(self._buffer)
+
+        waiting = self.ser.in_waiting
+        if waiting == 0:
+            # select() reported the descriptor readable but nothing is queued: the other side hung up
+            raise serial.SerialException("Port reported readable but returned no data (disconnected?)")
+
+        chunk = self.ser.read(min(waiting, free))
+        size = len(chunk)
+        self._filled_at = monotonic()
+        if self._length == 0 and size:
+            self._first_byte_at = self._filled_at
+        self._buffer[self._length : self._length + size] = chunk
+        self._length += size
+
+    def _pop_frame(self) -> Union[bytes, None]:
+        end = self._buffer.find(self.terminator, self._scanned, self._length)
+        if end == -1:
+            self._scanned = self._length
+            return None
+
+        end += 1
+        frame = bytes(self._buffer[:end])
+        rest = self._length - end
+        # move the remaining bytes to the front, the buffer keeps its size
+        self._buffer[:rest] = self._buffer[end : self._length]
+        self._length = rest
+        self._scanned = 0
+        self.frame_first_byte_at = self._first_byte_at
+        # the remaining bytes of the next frame arrived with the last read
+        self._first_byte_at = self._filled_at if rest else None
+        return frame
+
+
 def read_serialport_data(
     ser: serial.Serial,
     command: bytearray,